@@ -3,16 +3,43 @@ import os
 import pygame
 import pygame._sdl2.audio as sdl2_audio
 from pathlib import Path
-import comtypes
-from pycaw.utils import AudioUtilities
-from pycaw.api.endpointvolume import IAudioEndpointVolume
+# Windows audio stack, other platforms fall back to FakeMicBackend
+try:
+    import comtypes
+    from pycaw.utils import AudioUtilities
+    from pycaw.api.endpointvolume import IAudioEndpointVolume
+except ImportError:
+    comtypes = None
+try: from pycaw.callbacks import AudioEndpointVolumeCallback
+except ImportError: AudioEndpointVolumeCallback = None
 import webbrowser
 import urllib.request
+import urllib.parse
+import asyncio
+import json
+import base64
 import zipfile
 import tempfile
 import threading
+import queue
 import ctypes
 import time
+import math
+import wave
+import sqlite3
+from array import array
+import select
+import struct
+import bisect
+import hashlib
+import mmap
+import io
+import shutil
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+try: import numpy as np
+except ImportError: np = None
 
 # ------------------------------------------------------------------
 # Configuration & Assets
@@ -25,6 +52,10 @@ else:
     BUNDLE_DIR = Path(__file__).parent
 
 SOUNDS_DIR = EXE_DIR / "sounds"
+CACHE_DIR = EXE_DIR / "cache"
+INDEX_PATH = EXE_DIR / "library.db"
+# Where the index goes when the install folder is read-only
+USER_DIR = Path(os.environ.get("LOCALAPPDATA") or Path.home() / ".local" / "share") / "CarpeSimiusSoundboard"
 LOGO_PATH = BUNDLE_DIR / "logo.png"
 ICON_PATH = BUNDLE_DIR / "favicon.ico"
 
@@ -42,6 +73,108 @@ C_MODAL_OVERLAY = (0, 0, 0, 200)
 
 EXTS = {".mp3", ".wav", ".ogg"}
 
+# Memory for cached sounds (bytes), shared by decoded sounds and the
+# compressed file bytes kept for sounds that no longer fit decoded
+CACHE_BUDGET = 256 * 1024 * 1024
+PRELOAD_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Disk for decoded PCM in cache/, least recently used over it is removed
+CACHE_DISK_BUDGET = 2 * 1024 * 1024 * 1024
+# Younger cache files are never pruned, they may belong to an import in flight
+CACHE_PRUNE_GRACE = 600
+
+# Clips longer than this (or files bigger, while the length isn't indexed yet)
+# stream from disk instead of being decoded into memory
+STREAM_SECONDS = 30.0
+STREAM_BYTES = 8 * 1024 * 1024
+STREAM_CHUNK = 8192
+STREAM_AHEAD = 1.0
+# Samples analysed per slice when measuring, bounds the working copies
+MEASURE_CHUNK = 1 << 20
+
+# Batches of new files this big are decoded in worker processes
+IMPORT_MIN = 16
+IMPORT_WORKERS = os.cpu_count() or 2
+# Below this (0..1 full scale) counts as silence when finding trim points.
+# Playback starts TRIM_PREROLL before the first audible sample so the
+# attack stays whole, and stops TRIM_TAIL after the last one.
+TRIM = True
+TRIM_THRESHOLD = 0.01
+TRIM_PREROLL = 0.005
+TRIM_TAIL = 0.05
+
+# Voices playing at once. When full, the oldest or the quietest one gives way.
+# pygame's channels grow on demand up to CHANNEL_CAP.
+POLYPHONY = 16
+CHANNEL_CAP = 32
+STEAL = "oldest"
+# What clicking a sound that is still playing does, changed per sound with a
+# right click: play again on top, restart it, ignore the click, or "choke"
+# (stop every other choke sound, like an open and closed hi-hat)
+RETRIGGER_MODES = ("overlap", "restart", "ignore", "choke")
+RETRIGGER = "overlap"
+# Stopped voices fade out over this long instead of clicking
+STOP_FADE_MS = 5
+
+# Sounds are played back at this integrated loudness (LUFS). Quieter ones
+# are only raised by the software mixer, and never past full scale.
+NORMALIZE = True
+LOUDNESS_TARGET = -16.0
+LOUDNESS_MAX_GAIN = 4.0
+# ITU-R BS.1770 K-weighting biquads (b, a) at 48 kHz: high shelf, high pass
+K_SHELF = ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585))
+K_HIGHPASS = ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621))
+
+# Software mixer (needs NumPy), pygame's own channels are used without it
+SOFT_MIX = np is not None
+MIX_BLOCK = 512
+LIMIT_CEILING = 0.95
+LIMIT_LOOKAHEAD = 64
+LIMIT_RELEASE = 0.0005
+
+# Extra outputs (local monitor) follow the main device through a small FIFO,
+# resampled by up to DRIFT_MAX to absorb clock drift between the two
+MONITOR_OFF = "No Monitor"
+MONITOR_GAIN = 0.7
+DRIFT_MAX = 0.005
+DRIFT_GAIN = 0.002
+
+# Crossfade when moving playing sounds to another device
+XFADE_MS = 20
+
+# Where to go when the current output is unplugged, first match wins,
+# the system default after that
+AUDIO_FALLBACK = []
+
+# Frame pacing: full rate while animating, otherwise block on input
+FPS = 30
+IDLE_TIMEOUT = 500
+MIC_POLL_INTERVAL = 1.0
+# With change notifications: only to notice an unplugged or swapped default mic
+MIC_RECHECK_INTERVAL = 5.0
+
+# Sound grid: rows are only built while inside the viewport below VIEW_TOP
+VIEW_TOP = 140
+SCROLL_STEP = 60
+
+# Sounds folder watching: inotify on Linux, snapshot polling elsewhere
+WATCH_INTERVAL = 1.0
+WATCH_SETTLE = 0.1
+SOUNDS_CHANGED = pygame.event.custom_type()
+MIC_CHANGED = pygame.event.custom_type()
+
+# Global hotkeys: F2 over a sound (or Stop All), then a chord with Ctrl, Alt or Win, binds it
+# No chord is bound by default: a system-wide one would be taken from every other app
+HOTKEY_STOP = ":stop"
+CHORD_MODS = ("ctrl", "alt", "shift", "win")
+HOTKEY_BIND = pygame.event.custom_type()
+HOTKEY_FIRED = pygame.event.custom_type()
+
+# Local control API (HTTP + WebSocket), only ever bound to loopback
+API_ENABLED = True
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_DEVICE = pygame.event.custom_type()
+
 class DriverInstaller:
     def __init__(self):
         self.status = "Ready"
@@ -99,60 +232,1618 @@ class DriverInstaller:
         finally:
             self.is_working = False
 
-class MicController:
+if AudioEndpointVolumeCallback:
+    class MuteCallback(AudioEndpointVolumeCallback):
+        def __init__(self, listener):
+            super().__init__()
+            self.listener = listener
+
+        def on_notify(self, new_volume, new_mute, *args):
+            self.listener(bool(new_mute))
+
+class PycawMicBackend:
     def __init__(self):
         self.vol_iface = None
-        self.init_interface()
+        self.callback = None
+        self.dev_id = None
 
-    def init_interface(self):
+    def start(self):
+        try: comtypes.CoInitialize()
+        except: pass
+
+    def open(self):
+        self.close()
         try:
             mic = AudioUtilities.GetMicrophone()
             if mic:
                 iface = mic.Activate(IAudioEndpointVolume._iid_, comtypes.CLSCTX_ALL, None)
                 self.vol_iface = iface.QueryInterface(IAudioEndpointVolume)
+                self.dev_id = mic.GetId()
             else:
                 self.vol_iface = None
         except:
             self.vol_iface = None
 
-    def toggle(self):
-        if not self.vol_iface: self.init_interface()
-        if self.vol_iface:
+    def changed(self):
+        # Default mic swapped or unplugged since open()
+        try:
+            mic = AudioUtilities.GetMicrophone()
+            return (mic.GetId() if mic else None) != self.dev_id
+        except: return True
+
+    def get_mute(self): return bool(self.vol_iface.GetMute())
+
+    def set_mute(self, muted): self.vol_iface.SetMute(muted, None)
+
+    def subscribe(self, listener):
+        # Endpoint volume notifications, older pycaw builds have no callback helper
+        if not self.vol_iface or not AudioEndpointVolumeCallback: return False
+        try:
+            self.callback = MuteCallback(listener)
+            self.vol_iface.RegisterControlChangeNotify(self.callback)
+            return True
+        except:
+            self.callback = None
+            return False
+
+    def close(self):
+        if self.vol_iface and self.callback:
+            try: self.vol_iface.UnregisterControlChangeNotify(self.callback)
+            except: pass
+        self.vol_iface, self.callback, self.dev_id = None, None, None
+
+class FakeMicBackend:
+    # In-memory microphone for machines without the Windows audio stack.
+    # Bumping `device` stands for a swapped mic: the opened one stops working.
+    def __init__(self, muted=False, push=True):
+        self.muted = muted
+        self.push = push
+        self.listener = None
+        self.device = self.opened = 0
+
+    def start(self): pass
+
+    def open(self): self.opened = self.device
+
+    def changed(self): return self.opened != self.device
+
+    def get_mute(self):
+        if self.changed(): raise OSError("device invalidated")
+        return self.muted
+
+    def set_mute(self, muted):
+        if self.changed(): raise OSError("device invalidated")
+        self.muted = bool(muted)
+        if self.listener: self.listener(self.muted)
+
+    def subscribe(self, listener):
+        if self.push: self.listener = listener
+        return self.push
+
+    def close(self): self.listener = None
+
+class MicController:
+    # All backend calls happen on the worker thread (COM is apartment bound),
+    # the UI only queues commands and reads the last known state
+    def __init__(self, backend=None):
+        self.backend = backend or (PycawMicBackend() if comtypes else FakeMicBackend())
+        self.muted = False
+        self.pushes = False
+        self.cmds = queue.Queue()
+        self.poll_pending = False
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        self.backend.start()
+        self.connect()
+        self.publish(self.query())
+        while True:
+            cmd = self.cmds.get()
+            if cmd is None: break
+            if cmd == "toggle": self.publish(self.set_toggle())
+            elif cmd == "poll":
+                self.poll_pending = False
+                if self.backend.changed(): self.connect()
+                self.publish(self.query())
+        self.backend.close()
+
+    def connect(self):
+        self.backend.open()
+        self.pushes = self.backend.subscribe(self.publish)
+
+    def publish(self, muted):
+        # Called from the worker and from backend notification threads
+        if muted == self.muted: return
+        self.muted = muted
+        try: pygame.event.post(pygame.event.Event(MIC_CHANGED, muted=muted))
+        except pygame.error: pass
+
+    def toggle(self): self.cmds.put("toggle")
+
+    def poll(self):
+        if self.poll_pending: return
+        self.poll_pending = True
+        self.cmds.put("poll")
+
+    def is_muted(self): return self.muted
+
+    def stop(self): self.cmds.put(None)
+
+    def set_toggle(self):
+        # Toggle the mic that's the default now; a failed call reconnects and
+        # tries once more instead of losing the click
+        if self.backend.changed(): self.connect()
+        for attempt in range(2):
             try:
-                curr = self.vol_iface.GetMute()
-                self.vol_iface.SetMute(not curr, None)
-                return not curr
+                muted = not self.backend.get_mute()
+                self.backend.set_mute(muted)
+                return muted
             except:
-                self.init_interface()
-        return False
+                self.connect()
+        return self.muted
 
-    def is_muted(self):
-        if not self.vol_iface:
-            self.init_interface()
-            if not self.vol_iface: return False
+    def query(self):
         try:
-            return bool(self.vol_iface.GetMute())
+            return self.backend.get_mute()
         except:
-            self.init_interface()
+            self.connect()
             return False
 
+def chord_name(mods, key):
+    # Modifiers in a fixed order, so every chord has one spelling
+    return "+".join([m for m in CHORD_MODS if m in mods] + [key.lower()])
+
+def event_chord(e):
+    if e.key in (pygame.K_LCTRL, pygame.K_RCTRL, pygame.K_LALT, pygame.K_RALT,
+                 pygame.K_LSHIFT, pygame.K_RSHIFT, pygame.K_LGUI, pygame.K_RGUI): return None
+    mods = {m for m, k in (("ctrl", pygame.KMOD_CTRL), ("alt", pygame.KMOD_ALT), ("shift", pygame.KMOD_SHIFT), ("win", pygame.KMOD_GUI)) if e.mod & k}
+    return chord_name(mods, pygame.key.name(e.key))
+
+def chord_vk(chord):
+    # Win32 modifier flags and virtual key, None for keys without one
+    parts = chord.split("+")
+    key = parts[-1]
+    mods = sum({"alt": 0x1, "ctrl": 0x2, "shift": 0x4, "win": 0x8}.get(m, 0) for m in parts[:-1])
+    named = {"space": 0x20, "return": 0x0D, "tab": 0x09, "pause": 0x13, "page up": 0x21, "page down": 0x22, "end": 0x23,
+             "home": 0x24, "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28, "insert": 0x2D, "delete": 0x2E}
+    if len(key) == 1 and key.isalnum(): return mods, ord(key.upper())
+    if key[:1] == "f" and key[1:].isdigit() and 1 <= int(key[1:]) <= 24: return mods, 0x6F + int(key[1:])
+    if len(key) == 3 and key[0] == "[" and key[1].isdigit(): return mods, 0x60 + int(key[1])
+    return (mods, named[key]) if key in named else None
+
+class WinHotkeyBackend:
+    # RegisterHotKey on a thread of its own, which also runs the message loop
+    # WM_HOTKEY arrives on, so triggers work while another app has focus
+    WM_QUIT, WM_USER, WM_HOTKEY, WM_APP = 0x12, 0x400, 0x312, 0x8000
+    MOD_NOREPEAT = 0x4000
+    PM_NOREMOVE = 0
+
+    def __init__(self):
+        self.fire = None
+        self.tid = None
+        self.wanted = []
+        self.ids = {}
+
+    def start(self, fire):
+        self.fire = fire
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        msg = wintypes.MSG()
+        # The thread has no message queue until it asks for one; publishing
+        # tid before that would let register()'s WM_APP post fail
+        user32.PeekMessageW(ctypes.byref(msg), None, self.WM_USER, self.WM_USER, self.PM_NOREMOVE)
+        self.tid = ctypes.windll.kernel32.GetCurrentThreadId()
+        self._apply()
+        while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            if msg.message == self.WM_HOTKEY:
+                chord = self.ids.get(msg.wParam)
+                if chord: self.fire(chord)
+            elif msg.message == self.WM_APP: self._apply()
+        for i in self.ids: user32.UnregisterHotKey(None, i)
+
+    def _apply(self):
+        # Hotkeys belong to the thread that registered them
+        user32 = ctypes.windll.user32
+        for i in self.ids: user32.UnregisterHotKey(None, i)
+        self.ids = {}
+        for i, chord in enumerate(self.wanted, 1):
+            vk = chord_vk(chord)
+            if vk and user32.RegisterHotKey(None, i, vk[0] | self.MOD_NOREPEAT, vk[1]): self.ids[i] = chord
+            else: print(f"Hotkey Error: {chord} is taken or has no key code")
+
+    def register(self, chords):
+        self.wanted = list(chords)
+        if self.tid: ctypes.windll.user32.PostThreadMessageW(self.tid, self.WM_APP, 0, 0)
+
+    def stop(self):
+        if self.tid: ctypes.windll.user32.PostThreadMessageW(self.tid, self.WM_QUIT, 0, 0)
+
+class FakeHotkeyBackend:
+    # Synthetic chords, delivered from an input thread like a real backend
+    def __init__(self):
+        self.events = queue.Queue()
+        self.chords = set()
+        self.fire = None
+
+    def start(self, fire):
+        self.fire = fire
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            chord = self.events.get()
+            if chord is None: break
+            if chord in self.chords: self.fire(chord)
+
+    def register(self, chords): self.chords = set(chords)
+
+    def press(self, chord): self.events.put(chord)
+
+    def stop(self): self.events.put(None)
+
+class Hotkeys:
+    # Chords to sounds. The table is replaced, never changed in place, so
+    # backend threads read it without a lock and trigger straight away
+    # instead of waiting for the next frame.
+    def __init__(self, index, on_fire, backend=None):
+        self.index, self.on_fire = index, on_fire
+        self.table = index.hotkeys()
+        self.backend = backend
+        self.binding = None
+        self.fired = 0
+
+    def start(self):
+        if not self.backend: return
+        try:
+            self.backend.start(self.fire)
+            self.backend.register(list(self.table))
+        except Exception as e:
+            print(f"Hotkey Error: {e}")
+            self.backend = None
+
+    def fire(self, chord):
+        # While binding, a chord that's already registered arrives here
+        # instead of as a key press, the UI thread picks it up
+        if self.binding:
+            pygame.event.post(pygame.event.Event(HOTKEY_BIND, chord=chord))
+            return
+        target = self.table.get(chord)
+        if not target: return
+        self.fired += 1
+        self.on_fire(target)
+
+    def bind(self, chord, target):
+        # One chord per target, a chord moves to its newest target
+        table = {c: t for c, t in self.table.items() if t != target and c != chord}
+        if chord: table[chord] = target
+        self.table = table
+        self.index.save_hotkeys(table)
+        if self.backend: self.backend.register(list(table))
+
+    def chord_for(self, target): return next((c for c, t in self.table.items() if t == target), None)
+
+    def stop(self):
+        if self.backend: self.backend.stop()
+
+class ControlServer:
+    # HTTP and WebSocket control on an asyncio loop in its own thread.
+    # Play and stop are appended to a deque and run by a dispatcher thread,
+    # so decoding, the index and the voice locks never stall the loop; the
+    # frame loop isn't involved. Events come back through call_soon_threadsafe.
+    #   GET /sounds, /devices, /volume    POST /play, /stop, /volume, /device
+    #   WS /events: the same ops as {"op": "play", "name": ...}, plus pushed events
+    WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+    REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 403: "Forbidden", 404: "Not Found"}
+
+    def __init__(self, board, host=API_HOST, port=API_PORT):
+        self.board, self.host, self.port = board, host, port
+        self.loop = None
+        self.done = None
+        self.subs = set()
+        self.ready = threading.Event()
+        self.error = None
+        self.pending = deque()
+        self.wake = threading.Event()
+        self.running = False
+        self.names = (None, 0, {})
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._dispatch, daemon=True).start()
+        threading.Thread(target=lambda: asyncio.run(self._main()), daemon=True).start()
+        self.ready.wait(2.0)
+        return self.ready.is_set() and self.error is None
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.loop and self.done: self.loop.call_soon_threadsafe(self.done.set)
+
+    def submit(self, fn, *args):
+        # deque.append is atomic: the loop hands off and answers right away
+        self.pending.append((fn, args))
+        self.wake.set()
+
+    def _dispatch(self):
+        while self.running:
+            self.wake.wait()
+            self.wake.clear()
+            while self.pending:
+                fn, args = self.pending.popleft()
+                try: fn(*args)
+                except Exception as e: print(f"Control API Error: {e}")
+
+    def _play(self, path):
+        # Ignored, or no voice to be had: say so, nobody waited for the answer
+        if self.board.play(path) is None: self.publish({"event": "dropped", "path": path})
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.done = asyncio.Event()
+        try: server = await asyncio.start_server(self._client, self.host, self.port)
+        except OSError as e:
+            print(f"Control API Error: {e}")
+            self.error = e
+            self.ready.set()
+            return
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        watch = asyncio.create_task(self._watch())
+        async with server: await self.done.wait()
+        watch.cancel()
+
+    def publish(self, event):
+        # Any thread; costs nothing while nobody listens
+        if self.subs and self.loop: self.loop.call_soon_threadsafe(self._broadcast, json.dumps(event).encode())
+
+    def _broadcast(self, data):
+        for q in self.subs:
+            # A client that stopped reading misses events instead of piling them up
+            if q.qsize() < 256: q.put_nowait((1, data))
+
+    async def _watch(self):
+        # Sounds that ended on their own
+        last = set()
+        while True:
+            await asyncio.sleep(0.1)
+            if not self.subs: continue
+            now = self.board.now_playing()
+            if now != last: self._broadcast(json.dumps({"event": "playing", "paths": sorted(now)}).encode())
+            last = now
+
+    def allowed(self, headers):
+        # Loopback names only, and no web page driving it from a browser
+        # (DNS rebinding, cross-site requests)
+        local = ("localhost", "127.0.0.1", "::1")
+        host = urllib.parse.urlsplit("//" + headers.get("host", "")).hostname
+        origin = headers.get("origin")
+        return host in local and (origin is None or urllib.parse.urlsplit(origin).hostname in local)
+
+    def find(self, args, fresh=False):
+        # Lookup table rebuilt when the board's sound list changes, and on a
+        # miss in case it was patched in place
+        sounds = self.board.sounds
+        if fresh or self.names[0] is not sounds or self.names[1] != len(sounds):
+            snap = list(sounds)
+            table = {s["name"].lower(): s["path"] for s in reversed(snap)}
+            table.update((s["path"], s["path"]) for s in snap)
+            self.names = (sounds, len(snap), table)
+        table = self.names[2]
+        path = table.get(args.get("path")) or table.get(str(args.get("name", "")).lower())
+        return path if path or fresh else self.find(args, True)
+
+    def command(self, op, args):
+        b = self.board
+        if any(args.get(k) is not None and not isinstance(args[k], str) for k in ("path", "name")):
+            return 400, {"error": "path and name must be strings"}
+        if op == "sounds": return 200, {"sounds": [{"name": s["name"], "path": s["path"]} for s in list(b.sounds)], "playing": sorted(b.now_playing())}
+        if op == "devices": return 200, {"devices": list(b.devs), "current": b.curr_dev}
+        if op == "volume":
+            if "volume" in args:
+                try: b.set_volume(float(args["volume"]))
+                except (TypeError, ValueError): return 400, {"error": "volume must be a number"}
+            return 200, {"volume": b.volume}
+        if op == "device":
+            name = args.get("name")
+            if name is not None and name not in b.devs: return 404, {"error": "unknown device"}
+            # Reopening the mixer stays on the UI thread
+            b.request_device(name)
+            return 202, {"device": name or "System Default"}
+        # Accepted here, carried out in order by the dispatcher; outcomes are events
+        if op == "stop" and not args.get("path") and not args.get("name"):
+            self.submit(b.stop_all)
+            return 202, {"stop": "all"}
+        if op in ("play", "stop"):
+            path = self.find(args)
+            if not path: return 404, {"error": "unknown sound"}
+            self.submit(self._play if op == "play" else b.stop, path)
+            return 202, {op: path}
+        return 404, {"error": f"unknown op {op}"}
+
+    def http(self, method, path, body):
+        op = path.split("?")[0].strip("/")
+        if method == "GET" and op in ("sounds", "devices", "volume"): return self.command(op, {})
+        if method != "POST" or op not in ("play", "stop", "volume", "device"): return 404, {"error": "not found"}
+        try: args = json.loads(body or b"{}")
+        except ValueError: return 400, {"error": "body must be JSON"}
+        return self.command(op, args if isinstance(args, dict) else {})
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+                method, target = head[0].split(" ")[:2]
+                headers = {k.strip().lower(): v.strip() for k, _, v in (h.partition(":") for h in head[1:] if h)}
+                if not self.allowed(headers):
+                    await self._send(writer, 403, {"error": "forbidden"}, True)
+                    break
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._websocket(reader, writer, headers)
+                    break
+                n = int(headers.get("content-length") or 0)
+                if n > 1 << 16: raise ValueError("body too big")
+                body = await reader.readexactly(n) if n else b""
+                close = headers.get("connection", "").lower() == "close"
+                await self._send(writer, *self.http(method, target, body), close)
+                if close: break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError): pass
+        finally: writer.close()
+
+    async def _send(self, writer, status, data, close=False):
+        body = json.dumps(data).encode()
+        writer.write((f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: {'close' if close else 'keep-alive'}\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1(headers.get("sec-websocket-key", "").encode() + self.WS_GUID).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        # One writer task per client, fed by replies and broadcasts alike
+        q = asyncio.Queue()
+        self.subs.add(q)
+        pump = asyncio.create_task(self._pump(q, writer))
+        try:
+            while True:
+                op, data = await self._read_frame(reader)
+                if op == 8: break
+                if op == 9: q.put_nowait((10, data))
+                elif op == 1:
+                    try: msg = json.loads(data)
+                    except ValueError: msg = None
+                    if not isinstance(msg, dict):
+                        q.put_nowait((1, b'{"status": 400, "error": "messages must be JSON objects"}'))
+                        continue
+                    status, res = self.command(msg.get("op"), msg)
+                    res["status"] = status
+                    if "id" in msg: res["id"] = msg["id"]
+                    q.put_nowait((1, json.dumps(res).encode()))
+        finally:
+            self.subs.discard(q)
+            pump.cancel()
+
+    async def _pump(self, q, writer):
+        while True:
+            op, data = await q.get()
+            n = len(data)
+            head = bytes((0x80 | op, n)) if n < 126 else struct.pack(">BBH", 0x80 | op, 126, n) if n < 1 << 16 else struct.pack(">BBQ", 0x80 | op, 127, n)
+            writer.write(head + data)
+            await writer.drain()
+
+    async def _read_frame(self, reader):
+        b0, b1 = await reader.readexactly(2)
+        n = b1 & 0x7F
+        if n == 126: n = struct.unpack(">H", await reader.readexactly(2))[0]
+        elif n == 127: n = struct.unpack(">Q", await reader.readexactly(8))[0]
+        if n > 1 << 16: raise ValueError("frame too big")
+        mask = await reader.readexactly(4) if b1 & 0x80 else b""
+        data = await reader.readexactly(n)
+        if mask: data = (int.from_bytes(data, "big") ^ int.from_bytes((mask * (n // 4 + 1))[:n], "big")).to_bytes(n, "big")
+        return b0 & 0x0F, data
+
+class PcmCache:
+    def __init__(self, root=CACHE_DIR):
+        self.root = Path(root)
+        self.hashes = {}
+
+    def digest(self, path):
+        st = os.stat(path)
+        sig = (path, st.st_size, st.st_mtime_ns)
+        d = self.hashes.get(sig)
+        if d: return d
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+        d = self.hashes[sig] = self.hashes[(str(Path(path).resolve()),) + sig[1:]] = h.hexdigest()
+        return d
+
+    def seed(self, rows):
+        # Hashes the index already holds, valid while size and mtime match
+        for r in rows:
+            for p in {r["path"], str(Path(r["path"]).resolve())}: self.hashes[(p, r["size"], r["mtime"])] = r["hash"]
+
+    def entry(self, path): return self.entry_for(self.digest(path), pygame.mixer.get_init())
+
+    def entry_for(self, digest, fmt):
+        freq, size, chans = fmt
+        return self.root / f"{digest}-{freq}-{size}-{chans}.pcm"
+
+    def load(self, path, data=None):
+        # data: the file's bytes when the caller has read them already
+        entry = self.entry(path)
+        if entry.exists():
+            try:
+                # Sound(buffer=) copies the samples, the map can go right away
+                with open(entry, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    snd = pygame.mixer.Sound(buffer=mm)
+                # mtime doubles as last use for prune()
+                os.utime(entry)
+                return snd
+            except: pass
+        snd = pygame.mixer.Sound(file=io.BytesIO(data)) if data is not None else pygame.mixer.Sound(path)
+        self.store(entry, snd)
+        return snd
+
+    def store(self, entry, snd):
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f"{entry.name}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f: f.write(snd.get_raw())
+            os.replace(tmp, entry)
+        except Exception as e:
+            print(f"Cache Write Error: {e}")
+
+    def prune(self, keep, fmt, budget=CACHE_DISK_BUDGET):
+        # Content no longer on the board goes first, then the least recently
+        # used over budget, other device formats before this one
+        now = time.time()
+        tag = "-{}-{}-{}.pcm".format(*fmt) if fmt else None
+        old, used, freed = [], 0, 0
+        try: files = [(f, f.stat()) for f in self.root.iterdir() if f.suffix in (".pcm", ".tmp")]
+        except OSError: return 0
+        for f, st in files:
+            if now - st.st_mtime < CACHE_PRUNE_GRACE:
+                used += st.st_size
+            elif f.suffix == ".tmp" or f.name.split("-")[0] not in keep:
+                freed += self.remove(f, st)
+            else:
+                used += st.st_size
+                old.append((f.name.endswith(tag), st.st_mtime, f, st))
+        for _, _, f, st in sorted(old, key=lambda e: e[:2]):
+            if used <= budget: break
+            n = self.remove(f, st)
+            used, freed = used - n, freed + n
+        return freed
+
+    def remove(self, f, st):
+        try:
+            f.unlink()
+            return st.st_size
+        except OSError: return 0
+
+class SoundCache:
+    # Hot: decoded sounds. Warm: compressed file bytes, decoded again on use.
+    # Cold: nothing in memory, loaded from the disk cache or the file.
+    def __init__(self, budget=CACHE_BUDGET, disk=None, rank=None):
+        self.budget = budget
+        self.disk = disk
+        self.rank = rank
+        self.entries = OrderedDict()
+        self.warm = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.warm_hits = 0
+        self.misses = 0
+        self.spilled = False
+        self.epoch = 0
+        self.lock = threading.Lock()
+
+    @property
+    def full(self): return self.spilled or self.used >= self.budget
+
+    def get(self, path):
+        key = str(Path(path).resolve())
+        mtime = os.stat(key).st_mtime_ns
+        fmt = pygame.mixer.get_init()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == mtime:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                if entry[3] == fmt: return entry[1]
+            warm = self.warm.get(key)
+            if warm and warm[0] == mtime:
+                self.warm.move_to_end(key)
+                if not entry or entry[0] != mtime: self.warm_hits += 1
+            else:
+                warm = None
+                if not entry or entry[0] != mtime: self.misses += 1
+            epoch = self.epoch
+        # Decoded for another device format, convert instead of decoding again
+        snd = data = None
+        if entry and entry[0] == mtime:
+            raw = pcm_convert(entry[1].get_raw(), entry[3], fmt)
+            if raw is not None: snd = pygame.mixer.Sound(buffer=raw)
+        # Decode outside the lock so preload workers and clicks don't serialize
+        if snd is None and warm:
+            try: snd = pygame.mixer.Sound(file=io.BytesIO(warm[1]))
+            except: pass
+        if snd is None:
+            with open(key, "rb") as f: data = f.read()
+            snd = self.disk.load(key, data) if self.disk else pygame.mixer.Sound(file=io.BytesIO(data))
+        self.put(key, mtime, snd, epoch, fmt, data)
+        return snd
+
+    def put(self, key, mtime, snd, epoch=None, fmt=None, data=None):
+        fmt = fmt or pygame.mixer.get_init()
+        size = sound_bytes(snd, fmt)
+        with self.lock:
+            # Only worth keeping when it's much smaller than the decoded sound
+            if data is not None and len(data) < size // 2:
+                self.drop_warm(key)
+                self.warm[key] = (mtime, data)
+                self.used += len(data)
+            # Mixer was reopened while decoding, the sound is stale
+            if epoch is not None and epoch != self.epoch: return
+            self.drop(key)
+            self.entries[key] = (mtime, snd, size, fmt)
+            self.used += size
+            self.evict()
+
+    def evict(self):
+        # Least played sounds drop to their compressed bytes first, and out of
+        # memory once even those don't fit
+        rank = self.rank or (lambda k: 0)
+        for tier, drop in ((self.entries, self.drop), (self.warm, self.drop_warm)):
+            if self.used <= self.budget: return
+            self.spilled = True
+            # Stable sort: ties go least recently used first
+            for k in sorted(tier, key=rank):
+                drop(k)
+                if self.used <= self.budget: return
+
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry: self.used -= entry[2]
+
+    def drop_warm(self, key):
+        entry = self.warm.pop(key, None)
+        if entry: self.used -= len(entry[1])
+
+    def invalidate(self, path):
+        key = str(Path(path).resolve())
+        with self.lock:
+            self.drop(key)
+            self.drop_warm(key)
+
+    def retag(self):
+        # Mixer reopened: keep entries, they are converted on their next use
+        with self.lock: self.epoch += 1
+
+class Preloader:
+    def __init__(self, cache, workers=PRELOAD_WORKERS, skip=None):
+        self.cache = cache
+        self.skip = skip
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preload")
+        self.lock = threading.Lock()
+        self.gen = 0
+        self.total = 0
+        self.done = 0
+
+    @property
+    def busy(self): return self.done < self.total
+
+    def start(self, paths):
+        with self.lock:
+            self.gen += 1
+            self.total, self.done = len(paths), 0
+            gen = self.gen
+        # A new pass: whatever was invalidated or removed since the last spill has freed room
+        self.cache.spilled = False
+        for p in paths: self.pool.submit(self._load, gen, p)
+
+    def _load(self, gen, path, prep=None):
+        # prep (indexing a new file) runs even if this pass was superseded
+        if prep:
+            try: prep(path)
+            except: pass
+        if gen != self.gen: return
+        # Stop warming once the budget is spent, otherwise the LRU would
+        # evict the high priority sounds we loaded first
+        if not self.cache.full:
+            try:
+                if not (self.skip and self.skip(path)): self.cache.get(path)
+            except: pass
+        with self.lock:
+            if gen == self.gen: self.done += 1
+
+    def extend(self, paths, prep=None):
+        with self.lock:
+            self.total += len(paths)
+            gen = self.gen
+        for p in paths: self.pool.submit(self._load, gen, p, prep)
+
+    def shutdown(self):
+        self.gen += 1
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+def sound_bytes(snd, fmt=None):
+    fmt = fmt or pygame.mixer.get_init()
+    if not fmt: return 0
+    freq, size, chans = fmt
+    return int(snd.get_length() * freq) * chans * (abs(size) // 8)
+
+def pcm_convert(raw, src, dst):
+    # 16-bit PCM between mixer formats, None when it can't be done here
+    if src == dst: return raw
+    if np is None or not src or not dst or src[1] != -16 or dst[1] != -16: return None
+    a = np.frombuffer(raw, dtype=np.int16).reshape(-1, src[2]).astype(np.float32)
+    if dst[2] == 1: a = a.mean(axis=1, keepdims=True)
+    elif a.shape[1] < dst[2]: a = np.repeat(a[:, :1], dst[2], axis=1) if a.shape[1] == 1 else np.pad(a, ((0, 0), (0, dst[2] - a.shape[1])), mode="edge")
+    else: a = a[:, :dst[2]]
+    if src[0] != dst[0] and len(a) > 1:
+        n = max(1, round(len(a) * dst[0] / src[0]))
+        x = np.linspace(0, len(a) - 1, n)
+        a = np.stack([np.interp(x, np.arange(len(a)), a[:, c]) for c in range(a.shape[1])], axis=1)
+    return np.clip(a, -32768, 32767).astype(np.int16).tobytes()
+
+def sound_name(path):
+    return Path(path).stem.replace("_", " ").title()
+
+def sound_key(s): return (s["name"], s["path"])
+
+class SoundWatcher:
+    # inotify_event masks
+    IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_DELETE = 0x8, 0x40, 0x80, 0x200
+    IN_DELETE_SELF, IN_MOVE_SELF, IN_IGNORED = 0x400, 0x800, 0x8000
+
+    def __init__(self, root, interval=WATCH_INTERVAL):
+        self.root = Path(root).resolve()
+        self.interval = interval
+        self.snap = {}
+        self.lock = threading.Lock()
+        self.running = False
+
+    def stat(self, path):
+        try:
+            st = os.stat(path)
+            return (st.st_size, st.st_mtime_ns)
+        except OSError: return None
+
+    def scan(self):
+        snap = {}
+        try:
+            with os.scandir(self.root) as it:
+                for e in it:
+                    if os.path.splitext(e.name)[1].lower() in EXTS and e.is_file():
+                        st = e.stat()
+                        snap[os.path.join(self.root, e.name)] = (st.st_size, st.st_mtime_ns)
+        except OSError: pass
+        return snap
+
+    def rescan(self):
+        snap = self.scan()
+        with self.lock: self.snap = dict(snap)
+        return snap
+
+    def diff(self, new, paths=None):
+        # Compare against the last snapshot, optionally only for the given paths
+        with self.lock:
+            old = self.snap
+            keys = set(paths) if paths is not None else old.keys() | new.keys()
+            changes = []
+            for p in keys:
+                a, b = old.get(p), new.get(p)
+                if a == b: continue
+                changes.append(("add" if a is None else "remove" if b is None else "modify", p))
+                if b is None: old.pop(p, None)
+                else: old[p] = b
+        if changes: pygame.event.post(pygame.event.Event(SOUNDS_CHANGED, changes=changes))
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self): self.running = False
+
+    def _watch(self):
+        if sys.platform.startswith("linux") and self.root.is_dir():
+            try: self._inotify()
+            except Exception as e: print(f"Watcher Error: {e}")
+        while self.running:
+            time.sleep(self.interval)
+            self.diff(self.scan())
+
+    def _inotify(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init()
+        if fd < 0: raise OSError(ctypes.get_errno(), "inotify_init failed")
+        try:
+            mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE | self.IN_DELETE_SELF | self.IN_MOVE_SELF
+            if libc.inotify_add_watch(fd, str(self.root).encode(), mask) < 0:
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+            self.diff(self.scan())
+            while self.running:
+                if not select.select([fd], [], [], self.interval)[0]: continue
+                # Let bursts (copying a whole pack) settle into one delta
+                time.sleep(WATCH_SETTLE)
+                names = set()
+                while select.select([fd], [], [], 0)[0]:
+                    buf = os.read(fd, 64 * 1024)
+                    off = 0
+                    while off < len(buf):
+                        _, ev_mask, _, size = struct.unpack_from("iIII", buf, off)
+                        name = buf[off+16:off+16+size].rstrip(b"\0").decode(errors="replace")
+                        off += 16 + size
+                        # Folder itself went away, hand over to polling
+                        if ev_mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_IGNORED): return
+                        if os.path.splitext(name)[1].lower() in EXTS: names.add(name)
+                paths = [os.path.join(self.root, n) for n in names]
+                self.diff({p: st for p in paths if (st := self.stat(p))}, paths)
+        finally:
+            os.close(fd)
+
+class Voice:
+    def __init__(self, pcm, gain=1.0):
+        self.pcm = pcm
+        self.pos = 0
+        self.gain = gain
+        self.level = gain
+        self.stopping = False
+        self.done = False
+
+    # The mixer fades it out and drops it in its next block
+    def stop(self, fade=True): self.stopping = True
+
+    def read(self, n):
+        chunk = self.pcm[self.pos:self.pos + n]
+        self.pos += len(chunk)
+        if self.pos >= len(self.pcm): self.done = True
+        return chunk
+
+class StreamVoice:
+    # Fed by a reader thread that keeps STREAM_AHEAD seconds decoded in front
+    # of the mixer. Each counter has one writer, so no lock is shared with
+    # the audio thread.
+    def __init__(self, reader, freq, chans, gain=1.0):
+        self.reader, self.chans, self.gain = reader, chans, gain
+        self.level = gain
+        self.stopping = False
+        self.chunks = deque()
+        self.head, self.off = None, 0
+        self.ahead = int(STREAM_AHEAD * freq)
+        self.produced = self.consumed = 0
+        self.underruns = 0
+        self.eof = False
+        self.done = False
+        self.wake = threading.Event()
+        threading.Thread(target=self._fill, daemon=True).start()
+
+    def _fill(self):
+        try:
+            while not self.done:
+                if self.produced - self.consumed >= self.ahead:
+                    self.wake.wait(0.1)
+                    self.wake.clear()
+                    continue
+                chunk = self.reader.read(STREAM_CHUNK)
+                if not len(chunk): break
+                self.chunks.append(chunk)
+                self.produced += len(chunk)
+        except Exception as e:
+            print(f"Stream Error: {e}")
+        finally:
+            self.eof = True
+            self.reader.close()
+
+    def stop(self, fade=True): self.stopping = True
+
+    def read(self, n):
+        out, got = [], 0
+        while got < n:
+            if self.head is None or self.off >= len(self.head):
+                # Read eof first: once it's set no more chunks can arrive
+                eof = self.eof
+                if not self.chunks:
+                    if eof: self.done = True
+                    elif self.head is not None: self.underruns += 1
+                    break
+                self.head, self.off = self.chunks.popleft(), 0
+            take = self.head[self.off:self.off + n - got]
+            self.off += len(take)
+            got += len(take)
+            out.append(take)
+        self.consumed += got
+        if self.produced - self.consumed < self.ahead: self.wake.set()
+        if not out: return np.zeros((0, self.chans), np.int16)
+        return out[0] if len(out) == 1 else np.concatenate(out)
+
+class PcmReader:
+    # Mixer-format samples from the disk cache, read as they're needed
+    def __init__(self, path, chans, start=0):
+        self.f = open(path, "rb")
+        self.f.seek(start * 2 * chans)
+        self.chans = chans
+
+    def read(self, n):
+        raw = self.f.read(n * 2 * self.chans)
+        raw = raw[:len(raw) - len(raw) % (2 * self.chans)]
+        return np.frombuffer(raw, np.int16).reshape(-1, self.chans)
+
+    def close(self): self.f.close()
+
+class DecodeReader:
+    # A long clip with no decoded copy on disk yet. The first read, on the
+    # stream's reader thread, decodes it into the disk cache; playback then
+    # reads from there like any other cached clip.
+    def __init__(self, path, disk, fmt, start=0.0):
+        self.path, self.disk, self.fmt, self.start = path, disk, fmt, start
+        self.reader = None
+        self.pcm, self.pos = None, 0
+
+    def read(self, n):
+        if self.reader is None and self.pcm is None: self.open()
+        if self.reader: return self.reader.read(n)
+        chunk = self.pcm[self.pos:self.pos + n]
+        self.pos += len(chunk)
+        return chunk
+
+    def open(self):
+        entry = self.disk.entry(self.path)
+        start = int(self.start * self.fmt[0])
+        if not entry.exists():
+            snd = pygame.mixer.Sound(self.path)
+            self.disk.store(entry, snd)
+            if not entry.exists():
+                # Cache not writable: play from the decoded copy
+                self.pcm = np.frombuffer(snd, np.int16).reshape(-1, self.fmt[2])[start:]
+                return
+        self.reader = PcmReader(entry, self.fmt[2], start)
+
+    def close(self):
+        if self.reader: self.reader.close()
+        self.pcm = None
+
+class WaveReader:
+    # 16-bit WAV decoded chunk by chunk and converted to the mixer format
+    def __init__(self, path, fmt, start=0.0):
+        self.w = wave.open(str(path), "rb")
+        if self.w.getsampwidth() != 2:
+            self.w.close()
+            raise ValueError("not 16-bit PCM")
+        self.src = (self.w.getframerate(), -16, self.w.getnchannels())
+        self.fmt = fmt
+        self.w.setpos(min(int(start * self.src[0]), self.w.getnframes()))
+
+    def read(self, n):
+        raw = self.w.readframes(max(1, round(n * self.src[0] / self.fmt[0])))
+        return np.frombuffer(pcm_convert(raw, self.src, self.fmt), np.int16).reshape(-1, self.fmt[2])
+
+    def close(self): self.w.close()
+
+class ChannelVoice:
+    # A sound on one of pygame's channels, shaped like an engine voice
+    def __init__(self, channel, snd, level=1.0):
+        self.channel, self.snd, self.level = channel, snd, level
+
+    @property
+    def done(self): return not self.channel.get_busy() or self.channel.get_sound() is not self.snd
+
+    def stop(self, fade=True):
+        # A fading channel stays busy, so stealing cuts it to free the slot now
+        if self.done: return
+        if fade: self.channel.fadeout(STOP_FADE_MS)
+        else: self.channel.stop()
+
+class MusicVoice:
+    # pygame's one music stream, replaced by the next long clip
+    current = None
+
+    def __init__(self, level=1.0):
+        self.level = level
+        MusicVoice.current = self
+
+    @property
+    def done(self): return MusicVoice.current is not self or not pygame.mixer.music.get_busy()
+
+    def stop(self, fade=True):
+        if self.done: return
+        if fade: pygame.mixer.music.fadeout(STOP_FADE_MS)
+        else: pygame.mixer.music.stop()
+
+class VoiceManager:
+    # Decides what a trigger does to the voices already playing. Work per
+    # trigger is bounded by the polyphony, whatever the click rate.
+    def __init__(self, polyphony=POLYPHONY, steal=STEAL):
+        self.polyphony, self.steal = polyphony, steal
+        self.active = []
+        self.stolen = 0
+        self.ignored = 0
+        # Clicks and hotkey threads trigger concurrently
+        self.lock = threading.RLock()
+
+    def trigger(self, path, mode, start):
+        with self.lock: return self._trigger(path, mode, start)
+
+    def _trigger(self, path, mode, start):
+        # start() plays an already loaded sound and returns its voice, None when
+        # no channel is free. Decoding happens before the lock, never in start().
+        self.active = [a for a in self.active if not a[1].done]
+        if mode == "ignore" and any(a[0] == path for a in self.active):
+            self.ignored += 1
+            return None
+        # Cut, not faded: a fading channel would hold its slot past this trigger
+        if mode == "restart": self.release(lambda a: a[0] == path, False)
+        elif mode == "choke": self.release(lambda a: a[2] == "choke", False)
+        while len(self.active) >= self.polyphony: self.take()
+        v = start()
+        if v is None and self.active:
+            self.take()
+            v = start()
+        if v is not None: self.active.append((path, v, mode))
+        return v
+
+    def release(self, match, fade=True):
+        with self.lock:
+            for a in self.active:
+                if match(a): a[1].stop(fade)
+            self.active = [a for a in self.active if not match(a)]
+
+    def take(self):
+        # Oldest is first in the list; min() keeps that order on level ties
+        i = 0 if self.steal == "oldest" else min(range(len(self.active)), key=lambda j: self.active[j][1].level)
+        self.active.pop(i)[1].stop(fade=False)
+        self.stolen += 1
+
+    def stop_all(self):
+        with self.lock:
+            for a in self.active: a[1].stop()
+            self.active = []
+
+class AudioOutput:
+    # One SDL device. The main output renders blocks in its own callback and
+    # fans them out, the others play copies from their FIFO.
+    def __init__(self, engine, name, gain=1.0, main=False):
+        self.engine, self.name, self.gain, self.main = engine, name, gain, main
+        self.fade_in = False
+        self.lock = threading.Lock()
+        self.fifo = np.zeros((0, engine.chans), np.float32)
+        self.fill = 2.0 * engine.block
+        self.phase = 0.0
+        self.ratio = 1.0
+        self.dev = sdl2_audio.AudioDevice(devicename=name, iscapture=False, frequency=engine.freq,
+            audioformat=sdl2_audio.AUDIO_S16, numchannels=engine.chans, chunksize=engine.block,
+            allowed_changes=0, callback=self._callback)
+        self.dev.pause(0)
+
+    def push(self, block):
+        with self.lock:
+            self.fifo = np.concatenate((self.fifo, block))
+            # Device stalled, keep latency bounded
+            if len(self.fifo) > 8 * self.engine.block: self.fifo = self.fifo[-2 * self.engine.block:]
+
+    def pull(self, n):
+        # Steer the read rate toward a two block fill level
+        target = 2 * self.engine.block
+        with self.lock:
+            self.fill = 0.99 * self.fill + 0.01 * len(self.fifo)
+            self.ratio = 1 + max(-DRIFT_MAX, min(DRIFT_MAX, (self.fill - target) / target * DRIFT_GAIN))
+            pos = self.phase + self.ratio * np.arange(n)
+            i = pos.astype(np.intp)
+            if len(self.fifo) < i[-1] + 2:
+                self.phase = 0.0
+                return np.zeros((n, self.engine.chans), np.float32)
+            f = (pos - i)[:, None].astype(np.float32)
+            out = self.fifo[i] * (1 - f) + self.fifo[i + 1] * f
+            adv = self.phase + self.ratio * n
+            self.fifo = self.fifo[int(adv):]
+            self.phase = adv - int(adv)
+        return out
+
+    def close(self): self.dev.close()
+
+    def _callback(self, dev, mem):
+        out = np.asarray(mem)
+        n = len(out) // (2 * self.engine.chans)
+        try:
+            if self.main:
+                block = self.engine.render(n)
+                if self.fade_in:
+                    block = block * np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+                    self.fade_in = False
+                # Device switch: this block fades out here, the next one fades in there
+                if self.engine.handover:
+                    block = block * np.linspace(1.0, 0.0, n, dtype=np.float32)[:, None]
+                    self.engine.promote(self)
+            else: block = self.pull(n)
+            if self.gain != 1.0: block = np.clip(block * self.gain, -1.0, 1.0)
+            out[:] = (block * 32767).astype(np.int16).view(np.uint8).ravel()
+        except Exception as e:
+            print(f"Mix Error: {e}")
+            out[:] = 0
+
+class MixEngine:
+    # Sums voices block by block in the main output's SDL callback. New voices
+    # are handed over through a deque, so the UI never takes a lock the audio
+    # thread might be holding.
+    def __init__(self, freq, chans, block=MIX_BLOCK):
+        self.freq, self.chans, self.block = freq, chans, block
+        self.voices = []
+        self.incoming = deque()
+        self.master = 1.0
+        self.delay = np.zeros((LIMIT_LOOKAHEAD, chans), np.float32)
+        self.env = 1.0
+        self.outputs = []
+        self.handover = None
+        self.retired = []
+        self.swap_lock = threading.Lock()
+        self.load = 0.0
+        self.fade = max(1, min(block, freq * STOP_FADE_MS // 1000))
+
+    def open(self, name):
+        self.close()
+        self.outputs = [AudioOutput(self, name, main=True)]
+
+    def switch(self, name):
+        # Voices keep playing: the new device stays silent until the current
+        # one hands rendering over at a block boundary
+        new = AudioOutput(self, name)
+        self.handover = new
+        threading.Timer(0.5, self.reap).start()
+
+    def promote(self, old):
+        with self.swap_lock:
+            new, self.handover = self.handover, None
+            if not new: return
+            if old:
+                old.main = False
+                self.retired.append(old)
+            new.main = True
+            new.fade_in = True
+            self.outputs = [new] + [o for o in self.outputs if o is not old]
+
+    def reap(self):
+        # Old device never called back (unplugged?), take over without it
+        if self.handover: self.promote(self.outputs[0] if self.outputs else None)
+        with self.swap_lock: retired, self.retired = self.retired, []
+        for o in retired: o.close()
+
+    def add_output(self, name, gain=1.0):
+        self.remove_output(name)
+        out = AudioOutput(self, name, gain)
+        with self.swap_lock: self.outputs = self.outputs + [out]
+
+    def remove_output(self, name):
+        with self.swap_lock:
+            gone = [o for o in self.outputs if o.name == name and not o.main]
+            self.outputs = [o for o in self.outputs if o not in gone]
+        for o in gone: o.close()
+
+    def close(self):
+        # Lets stream readers wind down
+        for v in self.voices + list(self.incoming): v.done = True
+        for o in self.outputs + self.retired: o.close()
+        if self.handover: self.handover.close()
+        self.outputs, self.retired, self.handover = [], [], None
+
+    def render(self, frames):
+        t = time.perf_counter()
+        block = self.mix(frames)
+        # Mixed once, copied to every extra output
+        for o in self.outputs[1:]: o.push(block)
+        # Share of the block period spent mixing
+        self.load = 0.9 * self.load + 0.1 * (time.perf_counter() - t) * self.freq / max(1, frames)
+        return block
+
+    def play(self, snd, gain=1.0, start=0.0, end=None):
+        # Zero-copy view of the decoded samples, trimmed by slicing
+        pcm = pygame.sndarray.samples(snd)
+        if pcm.ndim == 1: pcm = pcm[:, None]
+        pcm = pcm[int(start * self.freq):int(end * self.freq) if end else None]
+        v = Voice(pcm, gain)
+        self.incoming.append(v)
+        return v
+
+    def stop_all(self):
+        for v in self.voices + list(self.incoming): v.stop()
+
+    def stream(self, reader, gain=1.0):
+        v = StreamVoice(reader, self.freq, self.chans, gain)
+        self.incoming.append(v)
+        return v
+
+    def mix(self, frames):
+        while self.incoming: self.voices.append(self.incoming.popleft())
+        out = np.zeros((frames, self.chans), np.float32)
+        alive = []
+        for v in self.voices:
+            if v.done: continue
+            if v.stopping:
+                # Faded out and released inside this one block
+                chunk = v.read(min(frames, self.fade))
+                out[:len(chunk)] += chunk * (np.linspace(v.gain, 0.0, len(chunk), dtype=np.float32)[:, None] / 32768)
+                v.done = True
+                continue
+            chunk = v.read(frames)
+            out[:len(chunk)] += chunk * (v.gain / 32768)
+            # For quietest-voice stealing
+            if len(chunk): v.level = float(np.abs(chunk[::16]).mean()) * v.gain / 32768
+            if not v.done: alive.append(v)
+        self.voices = alive
+        if self.master != 1.0: out *= self.master
+        return self.limit(out)
+
+    def limit(self, block):
+        # Look-ahead peak limiter: output is delayed by LIMIT_LOOKAHEAD frames
+        # so the gain is already down when a peak arrives
+        n, look = len(block), len(self.delay)
+        buf = np.concatenate((self.delay, block))
+        peak = np.abs(buf).max(axis=1)
+        need = np.minimum(1.0, LIMIT_CEILING / np.maximum(peak, 1e-9))
+        win = np.lib.stride_tricks.sliding_window_view(need, look + 1).min(axis=1)
+        # Instant attack, linear release from where the last block ended
+        ramp = LIMIT_RELEASE * np.arange(1, n + 1, dtype=np.float32)
+        floor = np.minimum.accumulate(np.concatenate(([self.env], win - ramp)))[1:]
+        gain = np.minimum(floor + ramp, 1.0)
+        self.env = float(gain[-1])
+        self.delay = buf[n:].copy()
+        return np.clip(buf[:n] * gain[:, None], -1.0, 1.0)
+
+def probe_format(path):
+    # Native sample rate and channel count from the file header, without decoding
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".wav":
+            with wave.open(path, "rb") as w: return w.getframerate(), w.getnchannels()
+        with open(path, "rb") as f: head = f.read(64 * 1024)
+        if ext == ".ogg":
+            i = head.find(b"\x01vorbis")
+            if i >= 0: return struct.unpack_from("<I", head, i + 12)[0], head[i + 11]
+        elif ext == ".mp3":
+            i = 0
+            if head[:3] == b"ID3":
+                s = head[6:10]
+                i = 10 + (s[0] << 21 | s[1] << 14 | s[2] << 7 | s[3])
+                with open(path, "rb") as f:
+                    f.seek(i)
+                    head, i = f.read(64 * 1024), 0
+            rates = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+            while i < len(head) - 4:
+                b1, b2, b3 = head[i+1], head[i+2], head[i+3]
+                ver, sr = (b1 >> 3) & 3, (b2 >> 2) & 3
+                if head[i] == 0xFF and b1 & 0xE0 == 0xE0 and ver in rates and sr < 3:
+                    return rates[ver][sr], 1 if b3 >> 6 == 3 else 2
+                i += 1
+    except Exception: pass
+    return None, None
+
+def pcm_levels(snd):
+    # Peak and RMS of the decoded samples, 0..1 full scale
+    fmt = pygame.mixer.get_init()
+    if not fmt or fmt[1] != -16: return None, None
+    if np is not None:
+        # Read in place, a slice at a time: long clips never get a float copy
+        a = np.frombuffer(snd, dtype=np.int16)
+        if not len(a): return 0.0, 0.0
+        peak, total = 0.0, 0.0
+        for i in range(0, len(a), MEASURE_CHUNK):
+            x = a[i:i + MEASURE_CHUNK].astype(np.float32)
+            peak, total = max(peak, float(np.abs(x).max())), total + float(np.dot(x, x))
+        return peak / 32768, math.sqrt(total / len(a)) / 32768
+    raw = snd.get_raw()
+    if not raw: return 0.0, 0.0
+    a = array("h", raw)
+    return max(max(a), -min(a)) / 32768, math.sqrt(sum(x * x for x in a) / len(a)) / 32768
+
+def pcm_trim(snd, threshold=TRIM_THRESHOLD):
+    # Seconds where the first audible sample starts and the last one ends
+    fmt = pygame.mixer.get_init()
+    if np is None or not fmt or fmt[1] != -16: return None, None
+    a = np.frombuffer(snd, dtype=np.int16).reshape(-1, fmt[2])
+    t = int(threshold * 32768)
+    step = MEASURE_CHUNK // fmt[2]
+    loud = lambda i: np.flatnonzero((np.abs(a[i:i + step].astype(np.int32)) > t).any(axis=1)) + i
+    # First audible frame from the front, last from the back
+    first = next((f[0] for f in map(loud, range(0, len(a), step)) if len(f)), None)
+    if first is None: return None, None
+    last = next(f[-1] for f in map(loud, range((len(a) - 1) // step * step, -1, -step)) if len(f))
+    return first / fmt[0], (last + 1) / fmt[0]
+
+def pcm_loudness(snd):
+    # Integrated loudness in LUFS (BS.1770: K-weighted, 400 ms blocks, gated)
+    fmt = pygame.mixer.get_init()
+    if not fmt or fmt[1] != -16: return None
+    rate, chans = fmt[0], fmt[2]
+    if np is None:
+        # Unweighted and ungated, close enough for speech and music
+        _, rms = pcm_levels(snd)
+        return -0.691 + 10 * math.log10(chans * rms * rms) if rms else None
+    a = np.frombuffer(snd, dtype=np.int16).reshape(-1, chans)
+    step = min(rate // 10, len(a))
+    if not step: return None
+    n = len(a) // step
+    # Power of each 100 ms sub-block through the filter's response (Parseval),
+    # instead of running the IIR sample by sample
+    z = np.exp(-2j * np.pi * np.minimum(np.fft.rfftfreq(step, 1 / rate), 24000) / 48000)
+    h = 1.0
+    for b, k in (K_SHELF, K_HIGHPASS): h = h * (b[0] + b[1] * z + b[2] * z * z) / (k[0] + k[1] * z + k[2] * z * z)
+    w = 2 * np.abs(h) ** 2
+    w[0] /= 2
+    if step % 2 == 0: w[-1] /= 2
+    power = np.empty(n)
+    for i in range(0, n, 512):
+        x = a[i * step:min(i + 512, n) * step].reshape(-1, step, chans).astype(np.float32) / 32768
+        spec = np.abs(np.fft.rfft(x, axis=1)) ** 2
+        power[i:i + len(spec)] = (spec * w[None, :, None]).sum(axis=(1, 2)) / step ** 2
+    # 400 ms blocks overlapping by 75 %, shorter clips count as one block
+    blocks = np.convolve(power, np.ones(4) / 4, "valid") if n >= 4 else power.mean(keepdims=True)
+    loud = -0.691 + 10 * np.log10(np.maximum(blocks, 1e-12))
+    keep = loud > -70
+    if not keep.any(): return None
+    keep &= loud > -0.691 + 10 * np.log10(blocks[keep].mean()) - 10
+    return float(-0.691 + 10 * np.log10(blocks[keep].mean()))
+
+def loudness_gain(info):
+    # Gain bringing a sound to LOUDNESS_TARGET without pushing its peak past full scale
+    if not NORMALIZE or not info or info.get("loudness") is None: return 1.0
+    gain = 10 ** ((LOUDNESS_TARGET - info["loudness"]) / 20)
+    if info.get("peak"): gain = min(gain, 1.0 / info["peak"])
+    return min(gain, LOUDNESS_MAX_GAIN)
+
+def measure_sound(path, disk, known=()):
+    # Decode through the disk cache and take everything the index keeps.
+    # Content in `known` was measured before, under this name or another.
+    st = os.stat(path)
+    digest = disk.digest(path)
+    rate, chans = probe_format(path)
+    info = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest, "rate": rate, "channels": chans}
+    if digest in known: return info
+    snd = disk.load(path)
+    peak, rms = pcm_levels(snd)
+    start, end = pcm_trim(snd)
+    info.update(duration=snd.get_length(), peak=peak, rms=rms, trim_start=start, trim_end=end, loudness=pcm_loudness(snd))
+    return info
+
+class SoundIndex:
+    COLUMNS = ("path", "size", "mtime", "hash", "duration", "rate", "channels", "peak", "rms", "plays", "last_played",
+               "trim_start", "trim_end", "loudness", "retrigger")
+    # Columns added after the first release, created on older databases too
+    ADDED = (("trim_start", "REAL"), ("trim_end", "REAL"), ("loudness", "REAL"), ("retrigger", "TEXT"))
+    # Depends only on the file's content, kept per hash
+    MEASURED = ("duration", "peak", "rms", "trim_start", "trim_end", "loudness")
+
+    def __init__(self, path=INDEX_PATH):
+        self.lock = threading.Lock()
+        # A read-only install folder falls back to the user's data folder,
+        # then to an index that lasts only this session
+        for p in (path, USER_DIR / "library.db", ":memory:"):
+            try:
+                if p != ":memory:": Path(p).parent.mkdir(parents=True, exist_ok=True)
+                self.open(p)
+                break
+            except (sqlite3.Error, OSError) as e:
+                print(f"Index Error: {p}: {e}")
+
+    def open(self, path):
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        try: self.create()
+        except:
+            self.db.close()
+            raise
+
+    def create(self):
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS sounds (
+                path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT,
+                duration REAL, rate INTEGER, channels INTEGER, peak REAL, rms REAL,
+                plays INTEGER NOT NULL DEFAULT 0, last_played REAL NOT NULL DEFAULT 0)""")
+            self.db.execute("CREATE TABLE IF NOT EXISTS hotkeys (chord TEXT PRIMARY KEY, target TEXT)")
+            have = {r[1] for r in self.db.execute("PRAGMA table_info(sounds)")}
+            for name, kind in self.ADDED:
+                if name not in have: self.db.execute(f"ALTER TABLE sounds ADD COLUMN {name} {kind}")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS analysis (hash TEXT PRIMARY KEY,
+                duration REAL, peak REAL, rms REAL, trim_start REAL, trim_end REAL, loudness REAL)""")
+            self.hashes = {h for (h,) in self.db.execute("SELECT hash FROM analysis")}
+
+    def sync(self, snap):
+        # Match the index to a {path: (size, mtime)} scan, return paths needing analysis
+        # Rows never measured (older databases) count as changed
+        with self.lock, self.db:
+            known = {p: (s, m) if ok else None for p, s, m, ok in
+                     self.db.execute("SELECT path, size, mtime, hash IN (SELECT hash FROM analysis) FROM sounds")}
+            gone = [(p,) for p in known.keys() - snap.keys()]
+            self.db.executemany("DELETE FROM sounds WHERE path = ?", gone)
+            self.db.executemany("INSERT OR IGNORE INTO sounds (path) VALUES (?)", [(p,) for p in snap.keys() - known.keys()])
+        return [p for p, sig in snap.items() if known.get(p) != sig]
+
+    def analyze(self, path, disk):
+        try: self.record(path, measure_sound(path, disk, self.hashes))
+        except Exception as e:
+            print(f"Index Error: {path}: {e}")
+
+    def record(self, path, info):
+        with self.lock, self.db:
+            if "loudness" in info:
+                self.db.execute(f"INSERT OR REPLACE INTO analysis (hash, {', '.join(self.MEASURED)}) VALUES (?{', ?' * len(self.MEASURED)})",
+                                (info["hash"], *(info[k] for k in self.MEASURED)))
+                self.hashes.add(info["hash"])
+            else:
+                row = self.db.execute(f"SELECT {', '.join(self.MEASURED)} FROM analysis WHERE hash = ?", (info["hash"],)).fetchone()
+                if row: info = info | dict(zip(self.MEASURED, row))
+            self.db.execute("INSERT OR IGNORE INTO sounds (path) VALUES (?)", (path,))
+            self.db.execute(f"UPDATE sounds SET {', '.join(k + '=?' for k in info)} WHERE path=?", (*info.values(), path))
+
+    def forget(self, path):
+        with self.lock, self.db: self.db.execute("DELETE FROM sounds WHERE path = ?", (path,))
+
+    def get(self, path):
+        with self.lock: row = self.db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM sounds WHERE path = ?", (path,)).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def query(self, where="1", order="path", params=()):
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM sounds WHERE {where} ORDER BY {order}", params).fetchall()
+        return [dict(zip(self.COLUMNS, r)) for r in rows]
+
+    def live_hashes(self):
+        with self.lock: return {h for (h,) in self.db.execute("SELECT DISTINCT hash FROM sounds WHERE hash IS NOT NULL")}
+
+    def plays(self):
+        with self.lock: return {p: [n, t] for p, n, t in self.db.execute("SELECT path, plays, last_played FROM sounds")}
+
+    def modes(self):
+        with self.lock: return dict(self.db.execute("SELECT path, retrigger FROM sounds WHERE retrigger IS NOT NULL"))
+
+    def set_mode(self, path, mode):
+        with self.lock, self.db: self.db.execute("UPDATE sounds SET retrigger=? WHERE path=?", (mode, path))
+
+    def hotkeys(self):
+        with self.lock: return dict(self.db.execute("SELECT chord, target FROM hotkeys"))
+
+    def save_hotkeys(self, table):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM hotkeys")
+            self.db.executemany("INSERT INTO hotkeys (chord, target) VALUES (?, ?)", table.items())
+
+    def save_plays(self, stats):
+        with self.lock, self.db:
+            self.db.executemany("UPDATE sounds SET plays=?, last_played=? WHERE path=?", [(n, t, p) for p, (n, t) in stats.items()])
+
+    def close(self):
+        with self.lock: self.db.close()
+
+def _import_init(fmt, root, known):
+    # Worker process: decode straight to the board's format, no real device needed
+    global _import_disk, _import_known
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.mixer.init(frequency=fmt[0], size=fmt[1], channels=fmt[2], allowedchanges=0)
+    _import_disk = PcmCache(root)
+    _import_known = known
+
+def _import_one(path):
+    try: return path, measure_sound(path, _import_disk, _import_known), None
+    except Exception as e: return path, None, str(e)
+
+class Importer:
+    # Decodes, measures and caches a batch of files across all cores, the
+    # results land in the index from this process
+    def __init__(self, index, root=CACHE_DIR, workers=IMPORT_WORKERS):
+        self.index, self.root, self.workers = index, root, workers
+        self.total = 0
+        self.done = 0
+        self.report = None
+        self.pool = None
+
+    @property
+    def busy(self): return self.done < self.total
+
+    def start(self, paths, fmt, on_done=None):
+        if self.busy: return False
+        self.total, self.done = len(paths), 0
+        def go():
+            self.run(paths, fmt)
+            if on_done: on_done(paths)
+        threading.Thread(target=go, daemon=True).start()
+        return True
+
+    def run(self, paths, fmt):
+        self.total, self.done = len(paths), 0
+        t = time.perf_counter()
+        ok = failed = size = 0
+        try:
+            # Spawned, as on Windows: a forked worker would inherit the open
+            # mixer and this process's threads
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_import_init,
+                                     initargs=(fmt, str(self.root), frozenset(self.index.hashes))) as pool:
+                self.pool = pool
+                for path, info, err in pool.map(_import_one, paths, chunksize=max(1, len(paths) // (self.workers * 8))):
+                    if info:
+                        self.index.record(path, info)
+                        ok += 1
+                        size += info["size"]
+                    else:
+                        print(f"Import Error: {path}: {err}")
+                        failed += 1
+                    self.done += 1
+        except Exception as e:
+            print(f"Import Error: {e}")
+        finally:
+            self.pool = None
+            self.done = self.total
+        secs = max(time.perf_counter() - t, 1e-6)
+        self.report = {"files": ok, "failed": failed, "mb": size / 2**20, "seconds": secs,
+                       "files_per_s": ok / secs, "mb_per_s": size / 2**20 / secs}
+        r = self.report
+        print(f"Imported {r['files']} files ({r['failed']} failed, {r['mb']:.1f} MB) in {secs:.2f}s: "
+              f"{r['files_per_s']:.0f} files/s, {r['mb_per_s']:.1f} MB/s")
+        return self.report
+
+    def stop(self):
+        pool = self.pool
+        if pool: pool.shutdown(wait=False, cancel_futures=True)
+
+def bulk_import(src=None):
+    # soundboard --import [DIR]: copy a sound pack into sounds/ and decode,
+    # measure and cache all of it before the board first opens
+    if src and not Path(src).is_dir():
+        print(f"Import Error: no folder {src}")
+        return {"error": f"no folder {src}"}
+    pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+    fmt = pygame.mixer.get_init()
+    pygame.mixer.quit()
+    SOUNDS_DIR.mkdir(parents=True, exist_ok=True)
+    if src and Path(src).resolve() != SOUNDS_DIR.resolve():
+        for p in sorted(Path(src).iterdir()):
+            if p.suffix.lower() in EXTS and p.is_file(): shutil.copy2(p, SOUNDS_DIR / p.name)
+    snap = SoundWatcher(SOUNDS_DIR).scan()
+    index = SoundIndex()
+    stale = index.sync(snap)
+    report = Importer(index).run(stale, fmt)
+    index.close()
+    return report
+
+class DeviceRegistry:
+    # Output names, enumerated at startup and again only on SDL hot-plug events
+    def __init__(self):
+        self.names = self.enumerate()
+        self.dirty = False
+
+    def enumerate(self):
+        try: return sdl2_audio.get_audio_device_names(False) or ["System Default"]
+        except: return ["System Default"]
+
+    def update(self):
+        new = self.enumerate()
+        added = [n for n in new if n not in self.names]
+        removed = [n for n in self.names if n not in new]
+        self.names = new
+        self.dirty = False
+        return added, removed
+
 class Button:
-    def __init__(self, rect, text, callback, color=C_BTN, hover_color=C_BTN_HOVER):
+    def __init__(self, rect, text, callback, color=C_BTN, hover_color=C_BTN_HOVER, alt_callback=None, stop_callback=None):
         self.rect = pygame.Rect(rect)
         self.text = text
+        self.tag = ""
         self.cb = callback
+        self.alt_cb = alt_callback
+        self.stop_cb = stop_callback
+        self.playing = False
         self.color = color
         self.hover_color = hover_color
         self.is_hovered = False
         self.active_timer = 0
+        self.label_key = None
+        self.labels = []
 
-    def draw(self, surface, font):
-        col = C_BTN_ACTIVE if self.active_timer > 0 else (self.hover_color if self.is_hovered else self.color)
-        if self.active_timer > 0: self.active_timer -= 1
-        
-        pygame.draw.rect(surface, col, self.rect, border_radius=8)
-        
-        # Word Wrap
+    def wrap(self, font):
+        # Word Wrap, rebuilt only when text, width or font change
+        key = (self.text, self.rect.width, font)
+        if key == self.label_key: return self.labels
         words = self.text.split(' ')
         lines = []
         curr = []
@@ -163,23 +1854,73 @@ class Button:
                 lines.append(' '.join(curr))
                 curr = [w]
         lines.append(' '.join(curr))
+        self.labels = [font.render(line, True, C_TEXT) for line in lines]
+        self.label_key = key
+        return self.labels
+
+    def fill_color(self):
+        return C_BTN_ACTIVE if self.active_timer > 0 else (self.hover_color if self.is_hovered else self.color)
+
+    def draw(self, surface, font, tag_font=None):
+        pygame.draw.rect(surface, self.fill_color(), self.rect, border_radius=8)
+        if self.tag and tag_font:
+            t = tag_font.render(self.tag, True, (150,150,150))
+            surface.blit(t, t.get_rect(right=self.rect.right - 8, bottom=self.rect.bottom - 4))
+        if self.playing and self.stop_cb:
+            pygame.draw.rect(surface, C_DANGER, self.stop_rect(), border_radius=3)
 
-        h = len(lines) * font.get_linesize()
+        labels = self.wrap(font)
+        h = len(labels) * font.get_linesize()
         y = self.rect.centery - h / 2
-        for line in lines:
-            t = font.render(line, True, C_TEXT)
+        for t in labels:
             surface.blit(t, t.get_rect(centerx=self.rect.centerx, top=y))
             y += font.get_linesize()
 
+    def stop_rect(self): return pygame.Rect(self.rect.right - 24, self.rect.top + 8, 16, 16)
+
     def handle_event(self, event):
         if event.type == pygame.MOUSEMOTION:
             self.is_hovered = self.rect.collidepoint(event.pos)
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.playing and self.stop_cb and self.stop_rect().collidepoint(event.pos):
+            self.stop_cb()
+            return True
         elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.is_hovered:
             self.active_timer = 10
             if self.cb: self.cb()
             return True
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3 and self.is_hovered:
+            if self.alt_cb: self.alt_cb()
+            return True
         return False
 
+class ButtonGrid:
+    def __init__(self, x, y, cell_w, cell_h, cols, gap=15):
+        self.x, self.y = x, y
+        self.cell_w, self.cell_h = cell_w, cell_h
+        self.cols = cols
+        self.gap = gap
+
+    def height(self, count):
+        rows = -(-count // self.cols)
+        return max(0, rows * self.cell_h - self.gap)
+
+    def rect(self, i):
+        r, c = divmod(i, self.cols)
+        return pygame.Rect(self.x + c*self.cell_w, self.y + r*self.cell_h, self.cell_w - self.gap, self.cell_h - self.gap)
+
+    def visible(self, top, bottom, count):
+        first = max(0, (top - self.y) // self.cell_h)
+        last = (bottom - self.y) // self.cell_h
+        return range(min(count, first * self.cols), min(count, (last + 1) * self.cols))
+
+    def at(self, pos):
+        # Cell index under the pointer, the caller checks the gutter via the button rect
+        px, py = pos[0] - self.x, pos[1] - self.y
+        if px < 0 or py < 0: return -1
+        c = px // self.cell_w
+        if c >= self.cols: return -1
+        return (py // self.cell_h) * self.cols + c
+
 class Dropdown:
     def __init__(self, x, y, w, h, font, options, on_select):
         self.rect = pygame.Rect(x, y, w, h)
@@ -307,14 +2048,52 @@ class Modal:
             if self.rect and self.rect.collidepoint(event.pos): return True
         return False
 
+class Renderer:
+    def __init__(self, screen):
+        self.screen = screen
+        self.full = True
+        self.dirty = []
+        self.seen = {}
+
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.full = True
+            self.seen.clear()
+        else: self.dirty.append(pygame.Rect(rect))
+
+    def track(self, key, rect, state):
+        # Repaint a widget's old and new area whenever its look changes
+        cur = (tuple(rect), state)
+        prev = self.seen.get(key)
+        if prev == cur: return
+        if prev: self.dirty.append(pygame.Rect(prev[0]))
+        self.dirty.append(pygame.Rect(rect))
+        self.seen[key] = cur
+
+    def render(self, paint):
+        if self.full:
+            self.screen.set_clip(None)
+            paint(self.screen.get_rect())
+            pygame.display.flip()
+        elif self.dirty:
+            clip = self.dirty[0].unionall(self.dirty[1:])
+            self.screen.set_clip(clip)
+            paint(clip)
+            self.screen.set_clip(None)
+            pygame.display.update(self.dirty)
+        self.full = False
+        self.dirty = []
+
 class Soundboard:
-    def __init__(self):
+    def __init__(self, imported=None):
         try: comtypes.CoInitialize()
         except: pass
-        self.mic_ctrl = MicController()
         pygame.init()
+        self.mic_ctrl = MicController()
         
         self.screen = pygame.display.set_mode((1000, 800), pygame.RESIZABLE)
+        self.rend = Renderer(self.screen)
+        self.mouse = (-1, -1)
         pygame.display.set_caption("Carpe Simius Soundboard")
         if LOGO_PATH.exists():
             try: pygame.display.set_icon(pygame.image.load(str(LOGO_PATH)))
@@ -326,122 +2105,679 @@ class Soundboard:
         self.running = True
         self.mic_muted = self.mic_ctrl.is_muted()
         self.poll_t = 0
-        self.devs = self.get_devices()
+        self.busy = True
+        self.pending = []
+        # Most played sounds stay decoded when memory runs short
+        self.cache = SoundCache(disk=PcmCache(), rank=lambda k: self.stats.get(k, [0, 0]))
+        # Long clips stream on play, warming them would defeat the point
+        self.preloader = Preloader(self.cache, skip=self.should_stream)
+        self.index = SoundIndex()
+        self.importer = Importer(self.index)
+        self.importer.report = imported
+        self.stats = {}
+        self.metrics = {"memory": 0, "stream": 0, "music": 0, "failed": 0}
+        # After --import the windowed exe has no console: the report goes in the strip
+        self.show_metrics = imported is not None
+        self.music = None
+        self.devices = DeviceRegistry()
+        self.devs = self.devices.names
         self.curr_dev = None
+        self.engine = None
+        self.monitor = None
+        self.playing = deque(maxlen=64)
+        self.voices = VoiceManager()
+        self.volume = 1.0
+        self.api = None
+        self.sounding = set()
+        self.modes = {}
         self.init_mixer(None)
         
         self.dd = Dropdown(20, 20, 220, 30, self.s_font, self.devs, self.on_dev_sel)
         self.dd.set_options(self.devs, self.curr_dev)
+        self.mon_dd = Dropdown(20, 60, 220, 30, self.s_font, [MONITOR_OFF], self.on_mon_sel)
+        self.update_monitor_options()
         self.inst = DriverInstaller()
         self.modal = Modal(500, 400, self.font, self.inst)
         
         self.show_help = not any("cable" in d.lower() or "virtual" in d.lower() for d in self.devs)
-        self.sounds, self.buttons = [], []
+        self.hotkeys = Hotkeys(self.index, self.fire_hotkey, WinHotkeyBackend() if sys.platform == "win32" else None)
+        self.sounds, self.buttons, self.btn_by_path = [], {}, {}
+        self.scroll = 0
+        self.watcher = SoundWatcher(SOUNDS_DIR)
         self.refresh()
+        self.watcher.start()
+        self.hotkeys.start()
+        if API_ENABLED:
+            self.api = ControlServer(self)
+            if not self.api.start(): self.api = None
 
     def refresh(self):
-        self.sounds = []
-        if SOUNDS_DIR.exists():
-            for f in SOUNDS_DIR.iterdir():
-                if f.suffix.lower() in EXTS:
-                    self.sounds.append({"name": f.stem.replace("_", " ").title(), "path": str(f.resolve())})
-        self.sounds.sort(key=lambda x: x["name"])
-        self.devs = self.get_devices()
-        self.dd.set_options(self.devs, self.curr_dev)
+        snap = self.watcher.rescan()
+        self.sounds = [{"name": sound_name(p), "path": p} for p in snap]
+        self.sounds.sort(key=sound_key)
+        stale = self.index.sync(snap)
+        # Unchanged files aren't hashed again to find their decoded copy
+        self.cache.disk.seed(self.index.query("hash IS NOT NULL"))
+        self.stats = self.index.plays()
+        self.modes = self.index.modes()
         self.layout()
+        # New files are warmed by reindex once measured, not decoded twice
+        self.preload(set(stale))
+        self.reindex(stale)
+        self.preloader.pool.submit(self.prune_cache)
+
+    def apply_changes(self, changes):
+        # Patch the sorted sound list in place instead of rescanning
+        fresh = []
+        for kind, path in changes:
+            s = {"name": sound_name(path), "path": path}
+            i = bisect.bisect_left(self.sounds, sound_key(s), key=sound_key)
+            found = i < len(self.sounds) and self.sounds[i]["path"] == path
+            if kind != "add": self.cache.invalidate(path)
+            if kind == "remove":
+                if found: del self.sounds[i]
+                self.btn_by_path.pop(path, None)
+                self.stats.pop(path, None)
+                self.modes.pop(path, None)
+                self.index.forget(path)
+                continue
+            if not found: self.sounds.insert(i, s)
+            fresh.append(path)
+        self.scroll_to(self.scroll)
+        self.reindex(fresh)
+        # Edited and removed files leave decoded PCM nobody will read again
+        self.preloader.pool.submit(self.prune_cache)
+
+    def prune_cache(self):
+        try:
+            freed = self.cache.disk.prune(self.index.live_hashes(), pygame.mixer.get_init())
+            if freed: print(f"Cache: removed {freed >> 20} MB of decoded audio")
+        except Exception as e: print(f"Cache Prune Error: {e}")
+
+    def reindex(self, paths):
+        # Only new or changed files get hashed and measured. A whole sound
+        # pack goes to worker processes; either way they then warm from the
+        # decoded copy measuring left in the disk cache.
+        if len(paths) >= IMPORT_MIN and self.importer.start(paths, pygame.mixer.get_init(), self.preloader.extend): return True
+        self.preloader.extend(paths, lambda p: self.index.analyze(p, self.cache.disk))
+        return False
+
+    def preload(self, skip=()):
+        # Most played first, most recently played breaks ties
+        order = sorted(self.sounds, key=lambda s: self.stats.get(s["path"], [0, 0]), reverse=True)
+        self.preloader.start([s["path"] for s in order if s["path"] not in skip])
 
     def layout(self):
-        self.buttons = []
         w, h = self.screen.get_size()
         cols = max(1, (w - 40) // 215)
-        for i, s in enumerate(self.sounds):
-            r = i // cols
-            c = i % cols
-            rect = (20 + c*215, 150 + r*115, 200, 100)
-            self.buttons.append(Button(rect, s["name"], lambda p=s["path"]: self.play(p)))
+        self.grid = ButtonGrid(20, 150, 215, 115, cols)
+        self.scroll_to(self.scroll)
+
+    def max_scroll(self):
+        h = self.screen.get_height()
+        return max(0, 150 + self.grid.height(len(self.sounds)) + 20 - h)
+
+    def scroll_to(self, y):
+        self.scroll = max(0, min(y, self.max_scroll()))
+        self.grid.y = 150 - self.scroll
+        self.sync_buttons()
+        self.rend.invalidate()
+
+    def sync_buttons(self):
+        # Build buttons for the rows in view, reusing the ones still visible
+        h = self.screen.get_height()
+        old, self.btn_by_path = self.btn_by_path, {}
+        self.buttons = {}
+        for i in self.grid.visible(VIEW_TOP, h, len(self.sounds)):
+            s = self.sounds[i]
+            b = old.get(s["path"])
+            if b: b.rect = self.grid.rect(i)
+            else:
+                b = Button(self.grid.rect(i), s["name"], lambda p=s["path"]: self.play(p),
+                           alt_callback=lambda p=s["path"]: self.cycle_mode(p), stop_callback=lambda p=s["path"]: self.stop(p))
+                b.tag = self.mode_tag(s["path"])
+                b.playing = s["path"] in self.sounding
+            self.buttons[i] = b
+            self.btn_by_path[s["path"]] = b
+        self.hovered = None
+        self.touched = set()
+        self.hover(pygame.mouse.get_pos())
+
+    def handle_scroll(self, e):
+        h = self.screen.get_height()
+        page = max(115, h - VIEW_TOP - 115)
+        if e.type == pygame.MOUSEWHEEL: self.scroll_to(self.scroll - e.y * SCROLL_STEP)
+        elif e.type == pygame.KEYDOWN:
+            step = {pygame.K_DOWN: 115, pygame.K_UP: -115, pygame.K_PAGEDOWN: page, pygame.K_PAGEUP: -page}.get(e.key)
+            if step: self.scroll_to(self.scroll + step)
+            elif e.key == pygame.K_HOME: self.scroll_to(0)
+            elif e.key == pygame.K_END: self.scroll_to(self.max_scroll())
+            else: return False
+        else: return False
+        return True
+
+    def hit(self, pos):
+        if pos[1] < VIEW_TOP: return None
+        b = self.buttons.get(self.grid.at(pos))
+        return b if b and b.rect.collidepoint(pos) else None
+
+    def hover(self, pos):
+        b = self.hit(pos)
+        if b is not self.hovered:
+            if self.hovered:
+                self.hovered.is_hovered = False
+                self.touched.add(self.hovered)
+            self.hovered = b
+        if b:
+            b.is_hovered = True
+            self.touched.add(b)
+
+    def dispatch(self, e):
+        if e.type == pygame.MOUSEMOTION: self.hover(e.pos)
+        elif self.hovered:
+            self.hovered.handle_event(e)
+            self.touched.add(self.hovered)
 
     def play(self, path):
-        try: pygame.mixer.Sound(path).play()
-        except: pass
+        st = self.stats.setdefault(path, [0, 0])
+        st[0] += 1
+        st[1] = time.time()
+        try:
+            # Measured once at indexing, playing only looks it up
+            info = self.index.get(path)
+            # A cache miss decodes here, without holding up clicks, stops or
+            # other threads' triggers
+            start, reader = self.prepare_voice(path, info)
+            v = self.voices.trigger(path, self.modes.get(path, RETRIGGER), start)
+            if v is None and reader: reader.close()
+            if v is not None: self.notify("play", path=path)
+            return v
+        except Exception as e:
+            self.metrics["failed"] += 1
+            print(f"Play Error: {path}: {e}")
 
-    def on_dev_sel(self, name): self.init_mixer(name)
+    def prepare_voice(self, path, info):
+        # The slow part of a trigger: the sound decoded or the stream opened.
+        # Returns what starts it, and the reader to close if it never does.
+        gain = loudness_gain(info)
+        start, end = self.trim(path, info)
+        if self.should_stream(path, info):
+            reader = self.open_stream(path, info, start) if self.engine else None
+            return lambda: self.start_stream(path, reader, gain), reader
+        snd = self.cache.get(path)
+        return lambda: self.start_sound(snd, info, gain, start, end), None
 
-    def get_devices(self):
-        try: return sdl2_audio.get_audio_device_names(False) or ["System Default"]
-        except: return ["System Default"]
+    def start_sound(self, snd, info, gain, start, end):
+        if self.engine: v = self.engine.play(snd, gain, start, end)
+        else:
+            # pygame can only turn a sound down
+            snd.set_volume(min(1.0, gain))
+            v = self.start_channel(snd, min(1.0, gain) * ((info or {}).get("rms") or 1.0))
+            if v: self.playing.append((snd, time.monotonic()))
+        if v: self.metrics["memory"] += 1
+        return v
+
+    def start_stream(self, path, reader, gain):
+        kind, v = self.stream(path, reader, gain)
+        self.metrics[kind] += 1
+        return v
+
+    def start_channel(self, snd, level):
+        # Grow the channel pool instead of failing silently when it's full
+        ch = pygame.mixer.find_channel()
+        n = pygame.mixer.get_num_channels()
+        if not ch and n < CHANNEL_CAP:
+            pygame.mixer.set_num_channels(min(CHANNEL_CAP, n * 2))
+            ch = pygame.mixer.find_channel()
+        if not ch: return None
+        ch.play(snd)
+        ch.set_volume(self.volume)
+        return ChannelVoice(ch, snd, level)
+
+    def stop(self, path):
+        self.voices.release(lambda a: a[0] == path)
+        self.notify("stop", path=path)
+
+    def stop_all(self):
+        # Panic: every voice fades out within one audio block, and frees its channel
+        self.voices.stop_all()
+        if self.engine: self.engine.stop_all()
+        elif pygame.mixer.get_init():
+            pygame.mixer.fadeout(STOP_FADE_MS)
+            pygame.mixer.music.fadeout(STOP_FADE_MS)
+        self.playing.clear()
+        self.notify("stop", path=None)
+
+    def set_volume(self, volume):
+        # Master volume: the engine's gain, or every channel pygame is playing on
+        self.volume = max(0.0, min(1.0, volume))
+        if self.engine: self.engine.master = self.volume
+        for a in list(self.voices.active):
+            if isinstance(a[1], ChannelVoice): a[1].channel.set_volume(self.volume)
+        if self.music: pygame.mixer.music.set_volume(self.music[2] * self.volume)
+        self.notify("volume", volume=self.volume)
+
+    def request_device(self, name):
+        # From other threads: the mixer is reopened on the UI thread
+        pygame.event.post(pygame.event.Event(API_DEVICE, name=name))
+
+    def now_playing(self):
+        return {a[0] for a in list(self.voices.active) if not a[1].done}
+
+    def notify(self, event, **data):
+        if self.api: self.api.publish(dict(event=event, **data))
+
+    def cycle_mode(self, path):
+        i = RETRIGGER_MODES.index(self.modes.get(path, RETRIGGER))
+        mode = self.modes[path] = RETRIGGER_MODES[(i + 1) % len(RETRIGGER_MODES)]
+        self.index.set_mode(path, mode)
+        b = self.btn_by_path.get(path)
+        if b: b.tag = self.mode_tag(path)
+
+    def mode_tag(self, path):
+        mode = self.modes.get(path, RETRIGGER)
+        return " · ".join(t for t in (self.hotkeys.chord_for(path), "" if mode == RETRIGGER else mode) if t)
 
-    def init_mixer(self, name):
-        if pygame.mixer.get_init(): pygame.mixer.quit()
+    def fire_hotkey(self, target):
+        # Runs on the backend's input thread
+        if target == HOTKEY_STOP: self.stop_all()
+        else: self.play(target)
+        # Wake the UI so the stop mark shows up
+        pygame.event.post(pygame.event.Event(HOTKEY_FIRED))
+
+    def on_key(self, e):
+        # Chords pressed while the window has focus, and F2 binding
+        hk = self.hotkeys
+        if hk.binding:
+            if e.key == pygame.K_ESCAPE: self.finish_binding(None)
+            elif e.key in (pygame.K_DELETE, pygame.K_BACKSPACE): self.finish_binding("")
+            else:
+                chord = event_chord(e)
+                # Plain keys would be taken from every other app
+                if chord and {"ctrl", "alt", "win"} & set(chord.split("+")[:-1]): self.finish_binding(chord)
+            return True
+        if e.key == pygame.K_F2 and self.hovered:
+            hk.binding = next(p for p, b in self.btn_by_path.items() if b is self.hovered)
+            return True
+        if e.key == pygame.K_F2 and self.toolbar_rects(self.screen.get_width())[3].collidepoint(self.mouse):
+            hk.binding = HOTKEY_STOP
+            return True
+        chord = event_chord(e)
+        if chord not in hk.table: return False
+        hk.fire(chord)
+        return True
+
+    def finish_binding(self, chord):
+        # None cancels, "" clears the sound's chord
+        path, self.hotkeys.binding = self.hotkeys.binding, None
+        if chord is None or not path: return
+        self.hotkeys.bind(chord or None, path)
+        for p, b in self.btn_by_path.items():
+            b.tag = self.mode_tag(p)
+            self.touched.add(b)
+
+    def should_stream(self, path, info=None):
+        info = info or self.index.get(path)
+        if info and info["duration"]: return info["duration"] > STREAM_SECONDS
+        try: return os.path.getsize(path) > STREAM_BYTES
+        except OSError: return False
+
+    def trim(self, path, info):
+        # Seconds to play from and to, skipping silence. pygame's own channels
+        # can't start mid-sound, so this only reaches the software mixer.
+        if not TRIM or not self.engine or not info or info.get("trim_start") is None: return 0.0, None
+        try: st = os.stat(path)
+        except OSError: return 0.0, None
+        # Trim points of an older version of the file
+        if (info["size"], info["mtime"]) != (st.st_size, st.st_mtime_ns): return 0.0, None
+        return max(0.0, info["trim_start"] - TRIM_PREROLL), info["trim_end"] + TRIM_TAIL
+
+    def stream(self, path, reader=None, gain=1.0):
+        if reader:
+            if self.engine: return "stream", self.engine.stream(reader, gain)
+            # The engine went away since the reader was opened
+            reader.close()
+        # No engine: pygame's music player decodes as it goes, one track at a
+        # time, and a new one replaces it
+        pygame.mixer.music.load(path)
+        pygame.mixer.music.set_volume(min(1.0, gain) * self.volume)
+        pygame.mixer.music.play()
+        self.music = (path, time.monotonic(), min(1.0, gain))
+        return "music", MusicVoice(min(1.0, gain))
+
+    def open_stream(self, path, info=None, start=0.0):
+        # The indexer leaves decoded PCM in the disk cache for any format,
+        # plain WAV can be read directly until then, anything else is decoded
+        # there by the stream itself
+        fmt = pygame.mixer.get_init()
+        info = info or self.index.get(path)
+        st = os.stat(path)
+        if info and info["hash"] and (info["size"], info["mtime"]) == (st.st_size, st.st_mtime_ns):
+            entry = self.cache.disk.entry_for(info["hash"], fmt)
+            if entry.exists(): return PcmReader(entry, fmt[2], int(start * fmt[0]))
+        if Path(path).suffix.lower() == ".wav":
+            try: return WaveReader(path, fmt, start)
+            except: pass
+        return DecodeReader(path, self.cache.disk, fmt, start)
+
+    def metrics_text(self):
+        m, c = self.metrics, self.cache
+        hits = 100 * c.hits // max(1, c.hits + c.warm_hits + c.misses)
+        warm = 100 * c.warm_hits // max(1, c.hits + c.warm_hits + c.misses)
+        text = (f"Plays: memory {m['memory']}  stream {m['stream']}  music {m['music']}   "
+                f"Cache: {len(c.entries)} decoded, {len(c.warm)} compressed, {c.used >> 20} MB, {hits}% hot / {warm}% warm hits")
+        vm = self.voices
+        text += f"   Voices: {sum(not a[1].done for a in vm.active)}/{vm.polyphony}, {vm.stolen} stolen, {vm.ignored} ignored, {m['failed']} failed"
+        if self.engine: text += f"   Mix load: {self.engine.load:.0%}"
+        r = self.importer.report
+        if r and "error" in r: text += f"   Import failed: {r['error']}"
+        elif r: text += f"   Import: {r['files']} files, {r['failed']} failed, {r['files_per_s']:.0f} files/s, {r['mb_per_s']:.1f} MB/s"
+        return text
+
+    def on_dev_sel(self, name):
+        if self.engine and name:
+            try:
+                self.engine.switch(name)
+                self.curr_dev = name
+                self.update_monitor_options()
+                return
+            except Exception as e:
+                print(f"Device Switch Error: {e}")
+        self.init_mixer(name)
+        self.preload()
+        self.update_monitor_options()
+
+    def capture_playing(self):
+        # Sounds still running on pygame's channels and how far in they are
+        now = time.monotonic()
+        self.playing = deque(((s, t) for s, t in self.playing if now - t < s.get_length()), maxlen=64)
+        return [(s, now - t) for s, t in self.playing] if pygame.mixer.get_busy() else []
+
+    def resume_playing(self, playing, src):
+        dst = pygame.mixer.get_init()
+        self.playing.clear()
+        for snd, offset in playing:
+            start = int(offset * src[0]) * src[2] * (abs(src[1]) // 8)
+            raw = pcm_convert(snd.get_raw()[start:], src, dst)
+            if not raw: continue
+            try:
+                s = pygame.mixer.Sound(buffer=raw)
+                s.set_volume(snd.get_volume())
+                s.play(fade_ms=XFADE_MS)
+                self.playing.append((s, time.monotonic()))
+            except: pass
+
+    def on_mon_sel(self, name):
+        if self.engine and self.monitor: self.engine.remove_output(self.monitor)
+        self.monitor = None if name == MONITOR_OFF else name
+        self.start_monitor()
+
+    def start_monitor(self):
+        if not self.engine or not self.monitor: return
+        try: self.engine.add_output(self.monitor, MONITOR_GAIN)
+        except Exception as e:
+            print(f"Monitor Error: {e}")
+            self.monitor = None
+            self.mon_dd.set_options(self.mon_dd.options, MONITOR_OFF)
+
+    def update_monitor_options(self):
+        # Any output except the one the board already plays to
+        busy = (self.curr_dev,)
+        if self.monitor in busy: self.on_mon_sel(MONITOR_OFF)
+        opts = [MONITOR_OFF] + [d for d in self.devs if d not in busy]
+        self.mon_dd.set_options(opts, self.monitor or MONITOR_OFF)
+
+    def on_devices_changed(self):
+        added, removed = self.devices.update()
+        if not added and not removed: return
+        self.devs = self.devices.names
+        if self.monitor in removed: self.on_mon_sel(MONITOR_OFF)
+        if self.curr_dev in removed:
+            fallback = next((d for d in AUDIO_FALLBACK if d in self.devs), None)
+            print(f"Output '{self.curr_dev}' removed, switching to {fallback or 'System Default'}")
+            self.on_dev_sel(fallback)
+        self.dd.set_options(self.devs, self.curr_dev)
+        self.update_monitor_options()
+
+    def init_mixer(self, name, playing=None, src=None):
+        # Cached sounds survive, they are converted if the new format differs
+        self.cache.retag()
+        # Their channels or engine are about to go away
+        self.voices.active = []
+        if self.engine: self.engine.close()
+        self.engine = None
+        music = None
+        if pygame.mixer.get_init():
+            src = pygame.mixer.get_init()
+            playing = self.capture_playing()
+            if self.music and pygame.mixer.music.get_busy(): music = self.music
+            if playing:
+                pygame.mixer.fadeout(XFADE_MS)
+                time.sleep(XFADE_MS / 1000)
+            pygame.mixer.quit()
         try:
             target = name if name else None
             pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512, devicename=target)
             self.curr_dev = target if target else "System Default"
         except:
-            if name: self.init_mixer(None)
+            if name: self.init_mixer(None, playing, src)
+            return
+        if playing: self.resume_playing(playing, src)
+        if music:
+            try:
+                pygame.mixer.music.load(music[0])
+                pygame.mixer.music.set_volume(music[2] * self.volume)
+                pygame.mixer.music.play(start=time.monotonic() - music[1], fade_ms=XFADE_MS)
+            except: self.music = None
+        self.start_engine(name)
+
+    def start_engine(self, name):
+        freq, size, chans = pygame.mixer.get_init()
+        # AudioDevice can't open the system default (it needs a name), and the
+        # first listed output isn't it: pygame's channels play there instead
+        if not SOFT_MIX or size != -16 or not name: return
+        try:
+            self.engine = MixEngine(freq, chans)
+            self.engine.master = self.volume
+            self.engine.open(name)
+        except Exception as e:
+            print(f"Mix Engine Error: {e}")
+            self.engine = None
+        self.start_monitor()
+
+    def toolbar_rects(self, w):
+        return pygame.Rect(260, 20, 100, 30), pygame.Rect(w-330, 20, 40, 30), pygame.Rect(w-160, 20, 140, 30), pygame.Rect(370, 20, 90, 30)
+
+    def update_widgets(self, w, h):
+        rend, mouse = self.rend, self.mouse
+        rr, hr, mr, sr = self.toolbar_rects(w)
+        rend.track("refresh", rr, rr.collidepoint(mouse))
+        rend.track("stop", sr, sr.collidepoint(mouse))
+        rend.track("help", hr, hr.collidepoint(mouse))
+        rend.track("mic", mr, (self.mic_muted, mr.collidepoint(mouse)))
+        pl, im = self.preloader, self.importer
+        rend.track("progress", (480, 20, max(160, w - 820), 30), self.hotkeys.binding or ((im.done, im.total) if im.busy else (pl.done, pl.total) if pl.busy else None))
+
+        # Buttons whose sound started or ended show or hide their stop mark
+        sounding = self.now_playing()
+        for p in sounding ^ self.sounding:
+            b = self.btn_by_path.get(p)
+            if b:
+                b.playing = p in sounding
+                self.touched.add(b)
+        self.sounding = sounding
+
+        # Only buttons that were hovered, clicked or started playing can change
+        flashing = False
+        for b in list(self.touched):
+            if b.active_timer > 0:
+                b.active_timer -= 1
+                flashing = True
+            rend.track(b, b.rect, (b.fill_color(), b.tag, b.playing))
+            if not b.active_timer and not b.is_hovered: self.touched.discard(b)
+
+        dd = self.dd
+        dr = dd.rect.copy()
+        if dd.is_open: dr.height += len(dd.options) * dd.rect.height
+        rend.track("dd", dr, (dd.is_open, dd.sel_idx, dd.hov_idx, tuple(dd.options)))
+        md = self.mon_dd
+        mdr = md.rect.copy()
+        if md.is_open: mdr.height += len(md.options) * md.rect.height
+        rend.track("mon", mdr, (bool(self.engine), md.is_open, md.sel_idx, md.hov_idx, tuple(md.options)))
+
+        modal = None
+        if self.show_help:
+            inst, br = self.modal.inst, self.modal.btn_rect
+            modal = (inst.status, inst.is_working, inst.is_done, inst.error, bool(br and br.collidepoint(mouse)))
+        # The overlay dims the whole window, so opening/closing it repaints everything
+        rend.track("modal", (0, 0, w, h), modal)
+        rend.track("metrics", (0, h - 30, w, 30), self.metrics_text() if self.show_metrics else None)
+
+        self.busy = flashing or dd.is_open or md.is_open or self.inst.is_working or pl.busy or im.busy
+
+    def paint(self, clip):
+        w, h = self.screen.get_size()
+        mouse = self.mouse
+        self.screen.fill(C_BG, clip)
+        rr, hr, mr, sr = self.toolbar_rects(w)
+
+        # Refresh Btn
+        col = C_BTN_HOVER if rr.collidepoint(mouse) else C_BTN
+        pygame.draw.rect(self.screen, col, rr, border_radius=5)
+        t = self.s_font.render("Refresh", True, C_TEXT)
+        self.screen.blit(t, t.get_rect(center=rr.center))
+
+        # Stop All Btn
+        col = C_DANGER if sr.collidepoint(mouse) else C_BTN
+        pygame.draw.rect(self.screen, col, sr, border_radius=5)
+        t = self.s_font.render("Stop All", True, C_TEXT)
+        self.screen.blit(t, t.get_rect(center=sr.center))
+
+        # Import / Preload Progress
+        pl, im = self.preloader, self.importer
+        if self.hotkeys.binding:
+            t = self.s_font.render("Press Ctrl/Alt + key (Esc cancels)", True, C_TEXT)
+            self.screen.blit(t, (480, 35 - t.get_height()//2))
+        elif im.busy or pl.busy:
+            t = self.s_font.render(f"Importing {im.done}/{im.total}" if im.busy else f"Loading {pl.done}/{pl.total}", True, (150,150,150))
+            self.screen.blit(t, (480, 35 - t.get_height()//2))
+
+        # Help Btn
+        col = C_ACCENT if hr.collidepoint(mouse) else C_BTN
+        pygame.draw.rect(self.screen, col, hr, border_radius=5)
+        t = self.s_font.render("?", True, C_TEXT)
+        self.screen.blit(t, t.get_rect(center=hr.center))
+
+        # Mic Btn
+        col = C_DANGER if self.mic_muted else (C_SAFE if not mr.collidepoint(mouse) else (80,220,80))
+        pygame.draw.rect(self.screen, col, mr, border_radius=5)
+        t = self.s_font.render("MIC MUTED" if self.mic_muted else "MIC ACTIVE", True, C_TEXT if self.mic_muted else (20,20,20))
+        self.screen.blit(t, t.get_rect(center=mr.center))
+
+        # Keep rows scrolled under the toolbar out of it
+        self.screen.set_clip(clip.clip(pygame.Rect(0, VIEW_TOP, w, h - VIEW_TOP)))
+        for b in self.buttons.values():
+            if b.rect.colliderect(clip): b.draw(self.screen, self.font, self.s_font)
+        self.screen.set_clip(clip)
+
+        # Scrollbar
+        ms = self.max_scroll()
+        if ms:
+            view = h - VIEW_TOP
+            bar_h = max(30, view * view // (view + ms))
+            bar_y = VIEW_TOP + (view - bar_h) * self.scroll // ms
+            pygame.draw.rect(self.screen, C_BTN_HOVER, (w - 8, bar_y, 4, bar_h), border_radius=2)
+
+        if not self.sounds:
+            t = self.font.render("No sounds found in 'sounds/' folder.", True, (150,150,150))
+            self.screen.blit(t, (w//2 - t.get_width()//2, h//2))
+
+        # Monitoring needs the software mixer
+        if self.engine: self.mon_dd.draw(self.screen)
+        self.dd.draw(self.screen)
+        if self.show_metrics:
+            t = self.s_font.render(self.metrics_text(), True, (150,150,150))
+            pygame.draw.rect(self.screen, C_MODAL_BG, (0, h - 30, w, 30))
+            self.screen.blit(t, (20, h - 15 - t.get_height()//2))
+        if self.show_help: self.modal.draw(self.screen, w, h)
 
     def run(self):
         while self.running:
             w, h = self.screen.get_size()
-            self.poll_t += 1
-            if self.poll_t > 30:
-                self.poll_t = 0
-                self.mic_muted = self.mic_ctrl.is_muted()
+            now = time.monotonic()
+            # Backends with change notifications push MIC_CHANGED on their own,
+            # a slow poll still catches the default mic changing under them
+            if now - self.poll_t >= (MIC_RECHECK_INTERVAL if self.mic_ctrl.pushes else MIC_POLL_INTERVAL):
+                self.poll_t = now
+                self.mic_ctrl.poll()
 
-            for e in pygame.event.get():
+            events, self.pending = self.pending + pygame.event.get(), []
+            for e in events:
                 if e.type == pygame.QUIT: self.running = False
                 elif e.type == pygame.VIDEORESIZE: self.layout()
+                elif e.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED): self.rend.invalidate()
+                elif e.type == SOUNDS_CHANGED: self.apply_changes(e.changes)
+                elif e.type == MIC_CHANGED: self.mic_muted = e.muted
+                elif e.type == API_DEVICE:
+                    self.on_dev_sel(e.name)
+                    self.dd.set_options(self.devs, self.curr_dev)
+                    self.notify("device", device=self.curr_dev)
+                elif e.type == HOTKEY_BIND:
+                    if self.hotkeys.binding: self.finish_binding(e.chord)
+                elif e.type in (pygame.AUDIODEVICEADDED, pygame.AUDIODEVICEREMOVED) and not e.iscapture: self.devices.dirty = True
                 
                 if self.show_help:
                     if self.modal.handle_event(e, lambda: setattr(self, 'show_help', False)): continue
                     continue
                 if self.dd.handle_event(e): continue 
+                if self.engine and self.mon_dd.handle_event(e): continue
+                if e.type == pygame.KEYDOWN and self.on_key(e): continue
+                if self.handle_scroll(e): continue
+                if e.type == pygame.KEYDOWN and e.key == pygame.K_F3:
+                    self.show_metrics = not self.show_metrics
+                    continue
+                if e.type == pygame.KEYDOWN and e.key == pygame.K_ESCAPE:
+                    self.stop_all()
+                    continue
 
                 if e.type == pygame.MOUSEBUTTONDOWN:
                     mx, my = e.pos
                     if w-160 <= mx <= w-20 and 20 <= my <= 50:
                         self.mic_ctrl.toggle()
-                        self.mic_muted = self.mic_ctrl.is_muted()
                     elif 260 <= mx <= 360 and 20 <= my <= 50: self.refresh()
+                    elif 370 <= mx <= 460 and 20 <= my <= 50: self.stop_all()
                     elif w-330 <= mx <= w-290 and 20 <= my <= 50: self.show_help = True
 
-                for b in self.buttons: b.handle_event(e)
+                self.dispatch(e)
 
-            self.screen.fill(C_BG)
-            
-            # Refresh Btn
-            rr = pygame.Rect(260, 20, 100, 30)
-            col = C_BTN_HOVER if rr.collidepoint(pygame.mouse.get_pos()) else C_BTN
-            pygame.draw.rect(self.screen, col, rr, border_radius=5)
-            t = self.s_font.render("Refresh", True, C_TEXT)
-            self.screen.blit(t, t.get_rect(center=rr.center))
-
-            # Help Btn
-            hr = pygame.Rect(w-330, 20, 40, 30)
-            col = C_ACCENT if hr.collidepoint(pygame.mouse.get_pos()) else C_BTN
-            pygame.draw.rect(self.screen, col, hr, border_radius=5)
-            t = self.s_font.render("?", True, C_TEXT)
-            self.screen.blit(t, t.get_rect(center=hr.center))
-
-            # Mic Btn
-            mr = pygame.Rect(w-160, 20, 140, 30)
-            col = C_DANGER if self.mic_muted else (C_SAFE if not mr.collidepoint(pygame.mouse.get_pos()) else (80,220,80))
-            pygame.draw.rect(self.screen, col, mr, border_radius=5)
-            t = self.s_font.render("MIC MUTED" if self.mic_muted else "MIC ACTIVE", True, C_TEXT if self.mic_muted else (20,20,20))
-            self.screen.blit(t, t.get_rect(center=mr.center))
-            
-            for b in self.buttons: b.draw(self.screen, self.font)
-            
-            if not self.buttons:
-                t = self.font.render("No sounds found in 'sounds/' folder.", True, (150,150,150))
-                self.screen.blit(t, (w//2 - t.get_width()//2, h//2))
-
-            self.dd.draw(self.screen)
-            if self.show_help: self.modal.draw(self.screen, w, h)
+            # One re-enumeration per burst of hot-plug events
+            if self.devices.dirty: self.on_devices_changed()
 
-            pygame.display.flip()
-            self.clock.tick(30)
+            self.mouse = pygame.mouse.get_pos()
+            self.update_widgets(*self.screen.get_size())
+            self.rend.render(self.paint)
+            if self.busy: self.clock.tick(FPS)
+            else:
+                # Nothing animating, sleep until input arrives or the mic poll is due
+                e = pygame.event.wait(IDLE_TIMEOUT)
+                if e.type != pygame.NOEVENT: self.pending.append(e)
+        if self.api: self.api.stop()
+        self.hotkeys.stop()
+        self.importer.stop()
+        self.preloader.shutdown()
+        self.watcher.stop()
+        self.mic_ctrl.stop()
+        if self.engine: self.engine.close()
+        self.index.save_plays(self.stats)
+        self.index.close()
         pygame.quit()
         sys.exit()
 
 if __name__ == '__main__':
-    Soundboard().run()
\ No newline at end of file
+    # Import workers re-enter here in the frozen exe
+    multiprocessing.freeze_support()
+    if "--import" in sys.argv:
+        i = sys.argv.index("--import")
+        report = bulk_import(sys.argv[i + 1] if i + 1 < len(sys.argv) else None)
+        Soundboard(report).run()
+    else: Soundboard().run()
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import time
+import json
+import base64
+import asyncio
+import threading
+
+# Headless: the control server on loopback against a stand-in board
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from soundboard import ControlServer
+
+class FakeBoard:
+    def __init__(self, n=50):
+        self.sounds = [{"name": f"clip{i}", "path": f"/sounds/clip{i}.wav"} for i in range(n)]
+        self.devs = ["Speakers", "Cable Input"]
+        self.curr_dev = None
+        self.volume = 1.0
+        self.playing = set()
+        self.plays = 0
+        self.slow = 0.0
+        self.lock = threading.Lock()
+        self.api = None
+
+    def play(self, path):
+        # A cache miss decoding on the dispatcher
+        if self.slow: time.sleep(self.slow)
+        with self.lock:
+            self.plays += 1
+            self.playing.add(path)
+        self.api.publish({"event": "play", "path": path})
+        return object()
+
+    def stop(self, path): self.playing.discard(path)
+    def stop_all(self): self.playing.clear()
+    def set_volume(self, v): self.volume = max(0.0, min(1.0, v))
+    def request_device(self, name): self.curr_dev = name
+    def now_playing(self): return set(self.playing)
+
+async def request(reader, writer, method, path, body=None, headers=""):
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n{headers}Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    head = (await reader.readuntil(b"\r\n\r\n")).decode().split("\r\n")
+    n = int([h for h in head if h.lower().startswith("content-length")][0].split(":")[1])
+    return int(head[0].split()[1]), json.loads(await reader.readexactly(n))
+
+async def ws_send(writer, msg):
+    data = json.dumps(msg).encode()
+    mask = os.urandom(4)
+    writer.write(bytes((0x81, 0x80 | len(data))) + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(data)))
+
+async def ws_recv(reader):
+    b0, b1 = await reader.readexactly(2)
+    n = b1 & 0x7F
+    if n == 126: n = int.from_bytes(await reader.readexactly(2), "big")
+    return json.loads(await reader.readexactly(n))
+
+async def drained(board, n, timeout=5.0):
+    end = time.perf_counter() + timeout
+    while board.plays < n and time.perf_counter() < end: await asyncio.sleep(0.001)
+    return board.plays == n
+
+async def run_checks(port, board, clients=8, per_client=250):
+    # Keep-alive clients firing play as fast as the server answers
+    async def client(c):
+        r, w = await asyncio.open_connection("127.0.0.1", port)
+        for i in range(per_client):
+            status, res = await request(r, w, "POST", "/play", {"name": f"clip{(c + i) % 50}"})
+            assert status == 202 and res["play"]
+        w.close()
+    t = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    total = clients * per_client
+    assert await drained(board, total), "Dispatcher lost triggers"
+    dt = time.perf_counter() - t
+    print(f"Triggers: {total} over {clients} connections")
+    print(f"Rate: {total / dt:.0f} triggers/s")
+
+    r, w = await asyncio.open_connection("127.0.0.1", port)
+    status, res = await request(r, w, "GET", "/sounds")
+    assert status == 200 and len(res["sounds"]) == 50
+    status, res = await request(r, w, "POST", "/volume", {"volume": 0.5})
+    assert status == 200 and board.volume == 0.5
+    status, res = await request(r, w, "POST", "/device", {"name": "Cable Input"})
+    assert status == 202 and board.curr_dev == "Cable Input"
+    status, _ = await request(r, w, "POST", "/play", {"name": "missing"})
+    assert status == 404
+    status, _ = await request(r, w, "POST", "/play", {"path": []})
+    assert status == 400
+
+    # A slow play on the dispatcher leaves the server answering
+    board.slow = 0.5
+    await request(r, w, "POST", "/play", {"name": "clip3"})
+    t = time.perf_counter()
+    status, _ = await request(r, w, "GET", "/sounds")
+    dt = time.perf_counter() - t
+    assert status == 200 and dt < 0.1, f"Server blocked for {dt*1e3:.0f} ms"
+    print(f"Answer during a slow play: {dt*1e3:.2f} ms")
+    assert await drained(board, total + 1)
+    board.slow = 0.0
+    w.close()
+
+    # A browser page on another site is turned away
+    r, w = await asyncio.open_connection("127.0.0.1", port)
+    status, _ = await request(r, w, "POST", "/play", {"name": "clip1"}, "Origin: http://evil.example\r\n")
+    assert status == 403
+    w.close()
+    print("Foreign origin: rejected")
+
+    # WebSocket: a command reply, then the pushed play event
+    r, w = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    w.write(f"GET /events HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+    assert b" 101 " in await r.readuntil(b"\r\n\r\n")
+    t = time.perf_counter()
+    await ws_send(w, {"op": "play", "name": "clip7", "id": 1})
+    got = [await ws_recv(r), await ws_recv(r)]
+    dt = time.perf_counter() - t
+    assert any(m.get("event") == "play" and m["path"].endswith("clip7.wav") for m in got)
+    assert any(m.get("id") == 1 and m["status"] == 202 for m in got)
+    # A malformed command is answered, the subscriber stays connected
+    await ws_send(w, {"op": "play", "name": {"x": 1}, "id": 2})
+    reply = await ws_recv(r)
+    assert reply["status"] == 400 and reply["id"] == 2
+    print(f"WebSocket round trip: {dt*1e3:.2f} ms")
+    w.close()
+
+def test_control_api():
+    board = FakeBoard()
+    api = board.api = ControlServer(board, port=0)
+    assert api.start(), "Control server failed to bind"
+    try: asyncio.run(run_checks(api.port, board))
+    finally: api.stop()
+
+if __name__ == "__main__":
+    test_control_api()
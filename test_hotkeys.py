@@ -0,0 +1,51 @@
+import os
+import time
+import threading
+import pygame
+
+# Headless: synthetic chords, no window or Windows hotkey API
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from soundboard import Hotkeys, FakeHotkeyBackend, SoundIndex, VoiceManager, ChannelVoice
+
+def test_dispatch_latency(rounds=500):
+    pygame.mixer.init()
+    snd = pygame.mixer.Sound(buffer=bytes(4410 * 4))
+    voices = VoiceManager()
+    started = threading.Event()
+    stamp = [0.0]
+
+    def start():
+        ch = snd.play()
+        return ChannelVoice(ch, snd) if ch else None
+
+    def on_fire(target):
+        # Same path as a click: voice manager, then the channel
+        voices.trigger(target, "restart", start)
+        stamp[0] = time.perf_counter()
+        started.set()
+
+    backend = FakeHotkeyBackend()
+    keys = Hotkeys(SoundIndex(":memory:"), on_fire, backend)
+    keys.bind("ctrl+alt+k", "clip")
+    keys.start()
+    try:
+        lat = []
+        for i in range(rounds):
+            started.clear()
+            t = time.perf_counter()
+            backend.press("ctrl+alt+k")
+            assert started.wait(1.0), "Hotkey never reached the audio path"
+            lat.append(stamp[0] - t)
+        assert keys.fired == rounds
+        lat.sort()
+        print(f"Rounds: {rounds}")
+        print(f"Median: {lat[len(lat)//2]*1e6:.0f} us")
+        print(f"P99: {lat[int(len(lat)*0.99)]*1e6:.0f} us")
+    finally:
+        keys.stop()
+        pygame.quit()
+
+if __name__ == "__main__":
+    test_dispatch_latency()
@@ -0,0 +1,67 @@
+import os
+import time
+import pygame
+
+# Headless: the fake backend needs no window or Windows audio stack
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from soundboard import MicController, FakeMicBackend, MIC_CHANGED
+
+def wait_for(muted, timeout=1.0):
+    end = time.perf_counter() + timeout
+    while time.perf_counter() < end:
+        e = pygame.event.wait(50)
+        if e.type == MIC_CHANGED and e.muted == muted: return True
+    return False
+
+def test_push_latency(rounds=200):
+    pygame.init()
+    backend = FakeMicBackend()
+    mic = MicController(backend)
+    try:
+        # Worker publishes the initial state before we start flipping it
+        time.sleep(0.1)
+        pygame.event.clear()
+        lat = []
+        for i in range(rounds):
+            muted = i % 2 == 0
+            t = time.perf_counter()
+            backend.set_mute(muted)
+            assert wait_for(muted), f"No MIC_CHANGED for muted={muted}"
+            lat.append(time.perf_counter() - t)
+        assert mic.is_muted() == backend.muted
+        lat.sort()
+        print(f"Rounds: {rounds}")
+        print(f"Median: {lat[len(lat)//2]*1e6:.0f} us")
+        print(f"P99: {lat[int(len(lat)*0.99)]*1e6:.0f} us")
+    finally:
+        mic.stop()
+        pygame.quit()
+
+def test_swapped_mic():
+    pygame.init()
+    backend = FakeMicBackend()
+    mic = MicController(backend)
+    try:
+        time.sleep(0.1)
+        pygame.event.clear()
+        # Default mic swapped: the old endpoint fails, the click must still land
+        backend.device += 1
+        mic.toggle()
+        assert wait_for(True), "Toggle lost after the mic changed"
+        assert backend.muted and backend.opened == backend.device
+        # Swapped again with no click: the slow poll reconnects
+        backend.device += 1
+        backend.muted = False
+        mic.poll()
+        assert wait_for(False), "Poll didn't pick up the new mic"
+        backend.set_mute(True)
+        assert wait_for(True), "No push from the new mic"
+        print("Swapped mic: toggle, poll and push all reached the new device")
+    finally:
+        mic.stop()
+        pygame.quit()
+
+if __name__ == "__main__":
+    test_push_latency()
+    test_swapped_mic()
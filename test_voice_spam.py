@@ -0,0 +1,34 @@
+import os
+import types
+import pygame
+
+# Headless: real pygame channels on the dummy audio driver
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from soundboard import Soundboard, VoiceManager, POLYPHONY
+
+def test_trigger_spam(rounds=200):
+    pygame.mixer.init()
+    pygame.mixer.set_num_channels(8)
+    snd = pygame.mixer.Sound(buffer=bytes(44100 * 4 * 2))
+    # start_channel only needs the board's master volume
+    board = types.SimpleNamespace(volume=1.0)
+    voices = VoiceManager()
+    try:
+        for mode in ("overlap", "restart", "choke"):
+            dropped = 0
+            for i in range(rounds):
+                path = f"clip{i % 40}"
+                if voices.trigger(path, mode, lambda: Soundboard.start_channel(board, snd, 1.0)) is None: dropped += 1
+            print(f"{mode}: {rounds} triggers, {dropped} dropped, {voices.stolen} stolen so far")
+            assert dropped == 0, f"{mode}: {dropped} triggers got no channel"
+            assert len(voices.active) <= POLYPHONY
+            voices.stop_all()
+            pygame.mixer.stop()
+        print(f"Channels: {pygame.mixer.get_num_channels()}")
+    finally:
+        pygame.quit()
+
+if __name__ == "__main__":
+    test_trigger_spam()